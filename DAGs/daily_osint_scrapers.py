@@ -1,7 +1,9 @@
 import os
 import sys
+import json
 from datetime import datetime, timedelta
 from airflow import DAG
+from airflow.decorators import task
 from airflow.operators.bash import BashOperator
 from airflow.operators.python import PythonOperator
 
@@ -9,11 +11,29 @@ PROJECT_DIR = '/mnt/h/ua-aid-intelligence-hub'
 if PROJECT_DIR not in sys.path:
     sys.path.append(PROJECT_DIR)
 
-from alert_telegram_bot.telegram_report import send_report_task_logic
+from alert_telegram_bot.telegram_report import send_report_task_logic, pull_task_outputs, parse_metrics_record
 
 # Added -u flag for unbuffered stdout/stderr to ensure immediate log capture
 PYTHON_EXEC = '/home/drkosher/airflow_project/venv/bin/python -u'
 
+# Technical Note: scripts stay BashOperator subprocesses rather than in-process Python tasks.
+# They run in the project venv (psycopg2, cloudscraper, pdfplumber, selenium), not in Airflow's
+# interpreter, keep module-level state (DB pool, run metrics, the instrumentation atexit hook)
+# per run, and their last stdout line is the XCom contract the report relies on.
+# The cold start costs about a second per task, which the parallel layout below more than repays.
+
+# Caps concurrent extractor tasks (and so the load on the external APIs) across all runs.
+# Create it once: airflow pools set osint_api 4 "External OSINT APIs"
+API_POOL = 'osint_api'
+# Upper bound of parallel CBA windows per run; short sync ranges get fewer
+CBA_SHARDS = 4
+
+# Ingest tasks whose metrics records carry the earliest date they changed (`changed_since`)
+INGEST_TASKS = ('extract_exchange_rates', 'extract_live_cba', 'extract_live_united24')
+
+# Mapped instances share a task id; the map index keeps their Prometheus textfiles apart
+SHARD_ENV = {'METRICS_SHARD': '{{ ti.map_index }}'}
+
 default_args = {
     'owner': 'kosher',
     'depends_on_past': False,
@@ -30,28 +50,113 @@ with DAG(
     tags=['production', 'osint']
 ) as dag:
 
-    # Scrapers with XCom push enabled to capture row counts from stdout
+    # Scrapers with XCom push enabled to capture row counts from stdout.
+    # The extractors share no data, so they all start at once, throttled only by API_POOL;
+    # conversion and rollups are deferred to convert_and_rollup, the one step that needs the rates.
     t1 = BashOperator(
         task_id='extract_exchange_rates',
-        bash_command=f'cd {PROJECT_DIR} && {PYTHON_EXEC} scrapers/currency_rates_scraper.py',
-        do_xcom_push=True
+        bash_command=f'cd {PROJECT_DIR} && {PYTHON_EXEC} scrapers/currency_rates_scraper.py --defer-post-process',
+        do_xcom_push=True,
+        pool=API_POOL
     )
 
     t2 = BashOperator(
         task_id='extract_news_context',
         bash_command=f'cd {PROJECT_DIR} && {PYTHON_EXEC} scrapers/news/news_scraper.py',
+        do_xcom_push=True,
+        pool=API_POOL
+    )
+
+    # Planners print a JSON list as their last stdout line: CBA sync windows and United24 categories
+    plan_cba = BashOperator(
+        task_id='plan_cba_windows',
+        bash_command=f'cd {PROJECT_DIR} && {PYTHON_EXEC} scrapers/come_back_alive/come_back_alive_live_scraper.py '
+                     f'--plan-shards {CBA_SHARDS}',
         do_xcom_push=True
     )
 
-    t3 = BashOperator(
+    plan_u24 = BashOperator(
+        task_id='discover_u24_categories',
+        bash_command=f'cd {PROJECT_DIR} && {PYTHON_EXEC} scrapers/united24/united24_live_scraper.py --list-categories',
+        do_xcom_push=True,
+        pool=API_POOL
+    )
+
+    # BashOperator pushes its last stdout line as a string; mapping needs a real list
+    @task
+    def cba_window_commands(plan_output):
+        return [
+            f'cd {PROJECT_DIR} && {PYTHON_EXEC} scrapers/come_back_alive/come_back_alive_live_scraper.py '
+            f'--window {date_from} {date_to} --defer-post-process'
+            for date_from, date_to in json.loads(plan_output)
+        ]
+
+    @task
+    def u24_category_commands(plan_output):
+        return [
+            f'cd {PROJECT_DIR} && {PYTHON_EXEC} scrapers/united24/united24_live_scraper.py '
+            f'--category {category} --defer-post-process'
+            for category in json.loads(plan_output)
+        ]
+
+    # One mapped instance per window / category; each retries and resumes on its own
+    t3 = BashOperator.partial(
         task_id='extract_live_cba',
-        bash_command=f'cd {PROJECT_DIR} && {PYTHON_EXEC} scrapers/come_back_alive/come_back_alive_live_scraper.py',
+        do_xcom_push=True,
+        pool=API_POOL,
+        env=SHARD_ENV,
+        append_env=True
+    ).expand(bash_command=cba_window_commands(plan_cba.output))
+
+    t4 = BashOperator.partial(
+        task_id='extract_live_united24',
+        do_xcom_push=True,
+        pool=API_POOL,
+        env=SHARD_ENV,
+        append_env=True
+    ).expand(bash_command=u24_category_commands(plan_u24.output))
+
+    # Earliest date any ingest task changed ('' if none), read from the mapped and plain XComs
+    @task(trigger_rule='all_done')
+    def collect_changed_since(ti=None):
+        days = [
+            record['changed_since']
+            for task_id in INGEST_TASKS
+            for record in map(parse_metrics_record, pull_task_outputs(ti, task_id))
+            if record and record.get('changed_since')
+        ]
+        return min(days, default='')
+
+    changed_since = collect_changed_since()
+
+    # Amount conversion and rollups, once per run, after the rates and donations have landed
+    t8 = BashOperator(
+        task_id='convert_and_rollup',
+        bash_command=f'cd {PROJECT_DIR} && {PYTHON_EXEC} processors/post_ingest.py '
+                     "--since '{{ ti.xcom_pull(task_ids='collect_changed_since') or '' }}'",
         do_xcom_push=True
     )
 
-    t4 = BashOperator(
-        task_id='extract_live_united24',
-        bash_command=f'cd {PROJECT_DIR} && {PYTHON_EXEC} scrapers/united24/united24_live_scraper.py',
+    # Incremental Parquet lake refresh for the notebooks; runs even if a scraper failed
+    t5 = BashOperator(
+        task_id='export_parquet_lake',
+        bash_command=f'cd {PROJECT_DIR} && {PYTHON_EXEC} processors/parquet_export.py',
+        do_xcom_push=True,
+        trigger_rule='all_done'
+    )
+
+    # Anomaly windows from the daily rollups refreshed by t8
+    t6 = BashOperator(
+        task_id='detect_donation_anomalies',
+        bash_command=f'cd {PROJECT_DIR} && {PYTHON_EXEC} processors/anomaly_detection.py',
+        do_xcom_push=True,
+        trigger_rule='all_done'
+    )
+
+    # Headlines around the anomaly windows found by t6
+    t7 = BashOperator(
+        task_id='correlate_anomaly_news',
+        bash_command=f'cd {PROJECT_DIR} && {PYTHON_EXEC} processors/news_correlation.py',
         do_xcom_push=True
     )
 
@@ -64,4 +169,9 @@ with DAG(
     )
 
     # Dependency Graph
-    t1 >> t2 >> [t3, t4] >> report_task
\ No newline at end of file
+    # (plan_cba >> t3 and plan_u24 >> t4 follow from the mapped XComs)
+    [t1, t3, t4] >> changed_since >> t8
+    t8 >> t6 >> t7
+    [t8, t2] >> t5
+    t2 >> t7
+    [t5, t7] >> report_task
@@ -1,15 +1,89 @@
 import requests
 import os
 import re
+import json
 from dotenv import load_dotenv
 
 ENV_PATH = '/mnt/h/ua-aid-intelligence-hub/.env'
 
 
+def parse_metrics_record(raw_output):
+    """
+    Returns the JSON metrics record printed as the last stdout line (see utils/run_metrics.py),
+    or None for tasks that still print a bare count.
+    """
+    lines = str(raw_output).strip().splitlines()
+    if not lines:
+        return None
+    try:
+        record = json.loads(lines[-1])
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def pull_task_outputs(ti, task_id):
+    """
+    XCom values of a task as a list: one per map index for mapped tasks (instances that
+    failed before printing push nothing), a single value for plain tasks.
+    """
+    value = ti.xcom_pull(task_ids=task_id)
+    if value is None:
+        return []
+    if isinstance(value, (str, bytes, dict, int, float)):
+        return [value]
+    return [item for item in value if item is not None]
+
+
+def combine_metrics_records(records):
+    """
+    Folds the records of a mapped task into one: counters and stage times add up, wall time
+    is the slowest instance (they run in parallel) and a failed instance fails the whole task.
+    """
+    combined = {'status': 'ok', 'wall_seconds': 0.0, 'stages': {}}
+    for record in records:
+        status = record.get('status', 'ok')
+        if status != 'ok' and combined['status'] != 'failed':
+            combined['status'] = status
+        combined['wall_seconds'] = max(combined['wall_seconds'], float(record.get('wall_seconds') or 0))
+        for name, seconds in record.get('stages', {}).items():
+            combined['stages'][name] = combined['stages'].get(name, 0.0) + seconds
+        for name, value in record.items():
+            if isinstance(value, (int, float)) and name != 'wall_seconds':
+                combined[name] = combined.get(name, 0) + value
+    return combined
+
+
+def format_metrics_line(t_id, record):
+    """
+    One report line with counts and throughput, plus the slowest stages.
+    """
+    status = "✅ OK" if record.get('status', 'ok') == 'ok' else f"❌ {record['status'].upper()}"
+    wall = float(record.get('wall_seconds') or 0)
+    fetched = record.get('rows_fetched', 0)
+    inserted = record.get('rows_inserted', 0)
+    http_requests = record.get('http_requests', 0)
+
+    def per_second(value):
+        return value / wall if wall > 0 else 0.0
+
+    line = (f"{t_id}: {status} ({inserted} rows) | "
+            f"{fetched} fetched, {record.get('rows_skipped', 0)} skipped, {per_second(fetched):.1f} rows/s | "
+            f"{http_requests} req, {per_second(http_requests):.1f} req/s, "
+            f"{record.get('bytes_downloaded', 0) / 1e6:.1f} MB | {wall:.1f}s")
+
+    stages = sorted(record.get('stages', {}).items(), key=lambda item: item[1], reverse=True)
+    if stages:
+        line += "\n    " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in stages[:4])
+    return line
+
+
 def send_report_task_logic(**context):
     """
     Parses XCom fragments from BashOperator stdout.
-    Implements regex filtering to extract pure numeric values from logs if necessary.
+    Scrapers push a JSON metrics record, rendered with throughput; tasks that print
+    a bare count fall back to regex filtering of the last numeric value.
+    Mapped tasks (CBA windows, United24 categories) are reported as one combined line.
     """
     load_dotenv(dotenv_path=ENV_PATH)
     token = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -20,13 +94,26 @@ def send_report_task_logic(**context):
         'extract_exchange_rates',
         'extract_news_context',
         'extract_live_cba',
-        'extract_live_united24'
+        'extract_live_united24',
+        'convert_and_rollup',
+        'export_parquet_lake',
+        'detect_donation_anomalies',
+        'correlate_anomaly_news'
     ]
 
     report_lines = [f"FINAL REPORT: {ti.dag_id}", "------------------"]
 
     for t_id in monitored_tasks:
-        raw_output = ti.xcom_pull(task_ids=t_id)
+        outputs = pull_task_outputs(ti, t_id)
+        raw_output = outputs[-1] if outputs else None
+
+        records = [record for record in map(parse_metrics_record, outputs) if record is not None]
+        if len(records) > 1:
+            report_lines.append(format_metrics_line(f"{t_id} x{len(records)}", combine_metrics_records(records)))
+            continue
+        if records:
+            report_lines.append(format_metrics_line(t_id, records[0]))
+            continue
 
         # Tech Lead Note: Extracting the last numeric value from potential log noise
         if raw_output:
@@ -48,4 +135,4 @@ def send_report_task_logic(**context):
     full_message = "\n".join(report_lines)
 
     url = f"https://api.telegram.org/bot{token}/sendMessage"
-    requests.post(url, json={"chat_id": chat_id, "text": full_message}, timeout=10)
\ No newline at end of file
+    requests.post(url, json={"chat_id": chat_id, "text": full_message}, timeout=10)
@@ -0,0 +1,127 @@
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Micro-benchmark of the United24 PDF parsing strategies in utils/u24_pdf_parser.py.
+# Every strategy parses every report in a fresh (spawned) process, so peak RSS is its own.
+# Agreement is checked against a reference strategy (default: table, the parser the live
+# scraper used before) on the exact multiset of (date, UAH, USD) rows and their sums.
+#
+#   python benchmarks/pdf_strategies.py [--pdfs data/raw/united24] [--repeat 3]
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from utils.u24_pdf_parser import STRATEGIES, count_pages, parse_report
+
+DEFAULT_PDF_DIR = BASE_DIR / 'data' / 'raw' / 'united24'
+
+
+def run_strategy(strategy, paths, repeat):
+    """
+    Runs in a spawned worker. Returns timing, peak RSS and the parsed rows per file.
+    """
+    best = None
+    rows = {}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = {path: parse_report(path, strategy=strategy) for path in paths}
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Linux reports ru_maxrss in KB
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return best, peak_rss_mb, rows
+
+
+def _row_key(row):
+    day, amount_uah, amount_usd = row
+    return day, round(amount_uah, 2), None if amount_usd is None else round(amount_usd, 2)
+
+
+def compare_rows(rows, reference):
+    """
+    Rows of one strategy against the reference, over all files.
+    """
+    mismatched = 0
+    for path, expected in reference.items():
+        got = Counter(map(_row_key, rows.get(path, [])))
+        want = Counter(map(_row_key, expected))
+        mismatched += sum(((got - want) + (want - got)).values())
+    return mismatched
+
+
+def run_benchmark(pdf_dir, strategies, reference, repeat):
+    paths = sorted(str(p) for p in Path(pdf_dir).glob('*.pdf'))
+    if not paths:
+        raise FileNotFoundError(f"No PDFs in {pdf_dir}")
+    pages = sum(count_pages(path) for path in paths)
+
+    parsed = {}
+    context = multiprocessing.get_context('spawn')
+    for strategy in dict.fromkeys([reference, *strategies]):
+        logging.info(f"Parsing {len(paths)} reports ({pages} pages) with '{strategy}'...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            parsed[strategy] = executor.submit(run_strategy, strategy, paths, repeat).result()
+
+    reference_rows = parsed[reference][2]
+    results = {}
+    for strategy, (seconds, peak_rss_mb, rows) in parsed.items():
+        all_rows = [row for file_rows in rows.values() for row in file_rows]
+        results[strategy] = {
+            'seconds': round(seconds, 3),
+            'pages_per_second': round(pages / seconds, 1),
+            'peak_rss_mb': round(peak_rss_mb, 1),
+            'rows': len(all_rows),
+            'sum_uah': round(sum(r[1] for r in all_rows), 2),
+            'sum_usd': round(sum(r[2] or 0 for r in all_rows), 2),
+            'mismatched_rows': compare_rows(rows, reference_rows),
+        }
+    return pages, results
+
+
+def pick_strategy(results):
+    """
+    The fastest strategy that agrees with the reference row for row.
+    """
+    correct = [name for name, r in results.items() if r['mismatched_rows'] == 0]
+    return max(correct, key=lambda name: results[name]['pages_per_second']) if correct else None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        stream=sys.stderr
+    )
+
+    parser = argparse.ArgumentParser(description="Compare United24 PDF parsing strategies")
+    parser.add_argument('--pdfs', default=str(DEFAULT_PDF_DIR), help="Directory of report PDFs")
+    parser.add_argument('--strategies', nargs='+', choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument('--reference', choices=STRATEGIES, default='table')
+    parser.add_argument('--repeat', type=int, default=3, help="Timed passes per strategy (best is kept)")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    pages, results = run_benchmark(args.pdfs, args.strategies, args.reference, args.repeat)
+    winner = pick_strategy(results)
+
+    if args.json:
+        print(json.dumps({'pages': pages, 'reference': args.reference, 'fastest_correct': winner,
+                          'results': results}, indent=2, sort_keys=True))
+    else:
+        print(f"{'strategy':<10}{'pages/s':>10}{'seconds':>10}{'rss MB':>9}{'rows':>8}"
+              f"{'sum UAH':>20}{'sum USD':>18}{'mismatch':>10}")
+        for name, r in sorted(results.items(), key=lambda item: -item[1]['pages_per_second']):
+            print(f"{name:<10}{r['pages_per_second']:>10.1f}{r['seconds']:>10.2f}{r['peak_rss_mb']:>9.1f}"
+                  f"{r['rows']:>8}{r['sum_uah']:>20.2f}{r['sum_usd']:>18.2f}{r['mismatched_rows']:>10}")
+        print(f"\n{pages} pages; reference '{args.reference}'; fastest correct strategy: {winner}")
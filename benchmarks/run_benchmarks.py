@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import socket
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import psycopg2
+
+# Offline replay benchmarks for the ingest scripts.
+# Every scraper runs as it does under Airflow (a separate `python -u` process), but against
+# benchmarks/stub_server.py instead of the live services and against a throwaway Postgres
+# schema instead of production. Its final stdout line is the JSON run record
+# (utils/run_metrics.py), which gives rows, requests and per-stage times; peak RSS comes
+# from wait4(). Results are saved as benchmarks/results/<commit>.json for comparison.
+#
+#   BENCH_DATABASE_URL=postgresql://... python benchmarks/run_benchmarks.py [--compare <commit>]
+#
+# Only the BENCH_SCHEMA schema of that database is dropped and recreated.
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from benchmarks.stub_server import StubData, StubServer, write_gdelt_fixture
+
+RESULTS_DIR = BASE_DIR / 'benchmarks' / 'results'
+BENCH_SCHEMA = 'ua_aid_bench'
+DEFAULT_U24_PDF_DIR = BASE_DIR / 'data' / 'raw' / 'united24'
+
+# Run order matters: donations are converted with the rates loaded by the first script
+SCRAPERS = {
+    'rates': 'scrapers/currency_rates_scraper.py',
+    'cba': 'scrapers/come_back_alive/come_back_alive_live_scraper.py',
+    'u24': 'scrapers/united24/united24_live_scraper.py',
+    'news': 'scrapers/news/news_scraper.py',
+}
+
+# Tables the production database already has; everything else is created by the scripts
+BASE_SCHEMA_DDL = '''
+    CREATE TABLE donations (
+        id BIGINT PRIMARY KEY,
+        amount REAL,
+        currency TEXT,
+        date DATE,
+        comment TEXT,
+        source TEXT,
+        foundation_name TEXT,
+        category TEXT
+    );
+    CREATE INDEX idx_donations_date ON donations (date);
+    CREATE TABLE news (
+        date DATE,
+        source TEXT,
+        headers TEXT
+    );
+'''
+
+
+def bench_database_url(url):
+    """
+    Pins the connection's search_path to BENCH_SCHEMA, so unqualified table names never reach public.
+    """
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != 'options']
+    query.append(('options', f"-csearch_path={BENCH_SCHEMA}"))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def reset_schema(url):
+    conn = psycopg2.connect(url)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+        cursor.execute(f"SET search_path TO {BENCH_SCHEMA}")
+        cursor.execute(BASE_SCHEMA_DDL)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def current_commit():
+    """
+    Returns (short_sha, dirty). Dirty trees get their own results file.
+    """
+    try:
+        sha = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        return sha, bool(status)
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', True
+
+
+def run_scraper(name, env, work_dir):
+    """
+    Runs one ingest script to completion and returns its benchmark entry.
+    """
+    stdout_path = work_dir / f"{name}.stdout"
+    stderr_path = work_dir / f"{name}.stderr"
+
+    started = datetime.now(timezone.utc)
+    with open(stdout_path, 'wb') as stdout, open(stderr_path, 'wb') as stderr:
+        process = subprocess.Popen([sys.executable, '-u', SCRAPERS[name]], cwd=BASE_DIR, env=env,
+                                   stdout=stdout, stderr=stderr)
+        # wait4 reports the peak RSS of this child (and of the pool workers it reaped)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    process_seconds = (datetime.now(timezone.utc) - started).total_seconds()
+
+    lines = stdout_path.read_text(encoding='utf-8', errors='replace').strip().splitlines()
+    try:
+        record = json.loads(lines[-1]) if lines else {}
+    except ValueError:
+        record = {}
+    if process.returncode != 0 or not record:
+        tail = stderr_path.read_text(encoding='utf-8', errors='replace').strip().splitlines()[-5:]
+        logging.error(f"{name} exited with {process.returncode}:\n" + "\n".join(tail))
+
+    wall = record.get('wall_seconds') or process_seconds
+    return {
+        'exit_code': process.returncode,
+        'status': record.get('status', 'no_record'),
+        'process_seconds': round(process_seconds, 3),
+        'wall_seconds': wall,
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'rows_fetched': record.get('rows_fetched', 0),
+        'rows_inserted': record.get('rows_inserted', 0),
+        'http_requests': record.get('http_requests', 0),
+        'bytes_downloaded': record.get('bytes_downloaded', 0),
+        'rows_per_second': round(record.get('rows_fetched', 0) / wall, 1) if wall else 0.0,
+        'requests_per_second': round(record.get('http_requests', 0) / wall, 1) if wall else 0.0,
+        'stages': record.get('stages', {}),
+    }
+
+
+def run_suite(database_url, names, runs, cba_records, articles, u24_pdf_dir):
+    data = StubData(cba_records=cba_records, articles=articles, u24_pdf_dir=u24_pdf_dir)
+    url = bench_database_url(database_url)
+    reset_schema(url)
+
+    results = {}
+    with StubServer(data) as server, tempfile.TemporaryDirectory(prefix='ua_aid_bench_') as tmp:
+        work_dir = Path(tmp)
+        env = dict(os.environ, DATABASE_URL=url, **server.scraper_env())
+        env.update({
+            'GDELT_FIXTURE': str(write_gdelt_fixture(data, server, work_dir / 'gdelt.csv')),
+            'GDELT_CACHE_DIR': str(work_dir / 'gdelt_cache'),
+            'U24_RAW_DIR': str(work_dir / 'u24_raw'),
+            'U24_LINK_CACHE_PATH': str(work_dir / 'u24_links.json'),
+        })
+        # Keep benchmark runs out of the production node-exporter textfiles
+        env.pop('METRICS_TEXTFILE_DIR', None)
+
+        for name in (n for n in SCRAPERS if n in names):
+            results[name] = []
+            for run in range(1, runs + 1):
+                logging.info(f"Running {name} ({run}/{runs})...")
+                results[name].append(run_scraper(name, env, work_dir))
+
+    return results
+
+
+def save_results(results, params):
+    sha, dirty = current_commit()
+    document = {
+        'commit': sha,
+        'dirty': dirty,
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'host': socket.gethostname(),
+        'python': platform.python_version(),
+        'params': params,
+        'results': results,
+    }
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    path = RESULTS_DIR / f"{sha}{'-dirty' if dirty else ''}.json"
+    path.write_text(json.dumps(document, indent=2, sort_keys=True), encoding='utf-8')
+    return path
+
+
+def load_results(ref):
+    path = Path(ref)
+    if not path.exists():
+        path = RESULTS_DIR / f"{ref}.json"
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def format_table(results, baseline=None):
+    header = f"{'scraper':<10}{'run':>4}{'rows':>9}{'rows/s':>10}{'req/s':>9}{'wall s':>9}{'rss MB':>9}  stages"
+    lines = [header, '-' * len(header)]
+    for name, runs in results.items():
+        for idx, entry in enumerate(runs):
+            stages = ', '.join(f"{k} {v:.2f}s" for k, v in
+                               sorted(entry['stages'].items(), key=lambda item: item[1], reverse=True)[:3])
+            line = (f"{name:<10}{idx + 1:>4}{entry['rows_fetched']:>9}{entry['rows_per_second']:>10.1f}"
+                    f"{entry['requests_per_second']:>9.1f}{entry['wall_seconds']:>9.2f}{entry['peak_rss_mb']:>9.1f}"
+                    f"  {stages}")
+
+            previous = (baseline or {}).get(name, [])
+            if idx < len(previous) and previous[idx]['wall_seconds']:
+                change = entry['wall_seconds'] / previous[idx]['wall_seconds'] - 1
+                line += f"  (wall {change:+.0%} vs baseline)"
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        stream=sys.stderr
+    )
+
+    parser = argparse.ArgumentParser(description="Replay benchmarks for the ingest scripts")
+    parser.add_argument('scrapers', nargs='*', help=f"Any of {', '.join(SCRAPERS)} (default: all)")
+    parser.add_argument('--runs', type=int, default=1,
+                        help="Runs per scraper on the same database; later runs measure the incremental path")
+    parser.add_argument('--cba-records', type=int, default=10000)
+    parser.add_argument('--articles', type=int, default=500)
+    parser.add_argument('--u24-pdfs', default=str(DEFAULT_U24_PDF_DIR), help="Directory of report PDFs to serve")
+    parser.add_argument('--compare', help="Commit (or results file) to compare against")
+    args = parser.parse_args()
+
+    unknown = set(args.scrapers) - set(SCRAPERS)
+    if unknown:
+        parser.error(f"Unknown scrapers: {', '.join(sorted(unknown))}")
+
+    database_url = os.getenv("BENCH_DATABASE_URL")
+    if not database_url:
+        parser.error("BENCH_DATABASE_URL is required (a throwaway Postgres; only its "
+                     f"'{BENCH_SCHEMA}' schema is touched)")
+
+    params = {'runs': args.runs, 'cba_records': args.cba_records, 'articles': args.articles,
+              'u24_pdfs': sorted(p.name for p in Path(args.u24_pdfs).glob('*.pdf'))}
+    results = run_suite(database_url, args.scrapers or list(SCRAPERS), args.runs,
+                        args.cba_records, args.articles, args.u24_pdfs)
+    path = save_results(results, params)
+
+    baseline = load_results(args.compare)['results'] if args.compare else None
+    print(format_table(results, baseline))
+    logging.info(f"Results saved to {path}")
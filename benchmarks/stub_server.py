@@ -0,0 +1,215 @@
+import json
+import random
+import hashlib
+import threading
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+# Local stand-in for the CBA, NBU, United24 and article endpoints.
+# Responses are built once, deterministically from a seed, in the shapes the scrapers parse:
+#   /cba/income               CBA income pages ({total_count, rows}) of the `date_from` .. `date_to` window
+#   /nbu/range?json           NBU_Exchange range JSON for one `valcode` between `start` and `end`
+#   /nbu/daily?json           NBU statdirectory JSON, every currency for one `date`
+#   /u24/reports              United24 report index linking every PDF of the fixture directory
+#   /u24/files/<name>.pdf     the PDFs themselves, with ETag / Last-Modified and 304 support
+#   /articles/<n>.html        article pages carrying an og:title
+# The GDELT side is a CSV for the LocalFixtureBackend (GDELT_FIXTURE), see write_gdelt_fixture().
+
+NBU_CURRENCIES = {'EUR': 978, 'USD': 840, 'GBP': 826, 'PLN': 985, 'CHF': 756, 'CAD': 124}
+CBA_CURRENCIES = ('UAH', 'UAH', 'UAH', 'USD', 'EUR')
+CBA_SOURCES = ('monobank', 'privat24', 'liqpay', 'swift')
+NEWS_SOURCES = ('theguardian.com', 'kyivindependent.com')
+
+
+class StubData:
+    """
+    Every response body the stub serves, generated up front so serving stays cheap.
+    """
+
+    def __init__(self, cba_records=10000, articles=500, u24_pdf_dir=None, seed=24):
+        rng = random.Random(seed)
+        today = date.today()
+
+        self.cba_rows = [
+            {
+                'id': 10_000_000 + i,
+                'amount': f"{rng.lognormvariate(5, 1.5):.2f}",
+                'currency': rng.choice(CBA_CURRENCIES),
+                'date': f"{today - timedelta(days=rng.randrange(90)):%Y-%m-%d}T{rng.randrange(24):02d}:00:00.000Z",
+                'comment': rng.choice(('', 'На ЗСУ', 'Slava Ukraini', 'monthly donation')),
+                'source': rng.choice(CBA_SOURCES),
+            }
+            for i in range(cba_records)
+        ]
+        self.cba_rows.sort(key=lambda row: row['date'])
+        self._cba_windows = {}
+
+        # One base rate per currency with a small daily drift, keyed by date
+        self._rate_base = {cc: rng.uniform(10, 55) for cc in NBU_CURRENCIES}
+        self._rate_seed = seed
+
+        self.articles = {
+            n: f"War in Ukraine: fixture headline number {n}" for n in range(articles)
+        }
+
+        self.pdfs = {}
+        if u24_pdf_dir:
+            for path in sorted(Path(u24_pdf_dir).glob('*.pdf')):
+                content = path.read_bytes()
+                modified = datetime.fromtimestamp(path.stat().st_mtime, timezone.utc)
+                self.pdfs[path.name] = (content, f'"{hashlib.sha256(content).hexdigest()[:32]}"',
+                                        format_datetime(modified, usegmt=True))
+
+    def cba_window(self, date_from, date_to):
+        """
+        Rows dated within the window (ISO timestamps compare as strings), memoized per window.
+        """
+        key = (date_from, date_to)
+        if key not in self._cba_windows:
+            self._cba_windows[key] = [
+                row for row in self.cba_rows if (not date_from or row['date'] >= date_from)
+                and (not date_to or row['date'] <= date_to)
+            ]
+        return self._cba_windows[key]
+
+    def nbu_record(self, cc, day):
+        drift = random.Random(f"{self._rate_seed}-{cc}-{day.isoformat()}").uniform(-0.02, 0.02)
+        rate = round(self._rate_base[cc] * (1 + drift), 4)
+        return {
+            'exchangedate': f"{day:%d.%m.%Y}", 'r030': NBU_CURRENCIES[cc], 'cc': cc,
+            'rate': rate, 'units': 1, 'rate_per_unit': rate,
+        }
+
+    def nbu_range(self, cc, start, end):
+        if cc not in NBU_CURRENCIES:
+            return []
+        days = (end - start).days + 1
+        return [self.nbu_record(cc, start + timedelta(days=i)) for i in range(max(days, 0))]
+
+    def gdelt_rows(self, base_urls, days=30):
+        """
+        (event_date, source, url) rows spread over the last `days` days; articles alternate
+        between the given base URLs so headline fetching sees more than one domain.
+        """
+        today = date.today()
+        return [
+            ((today - timedelta(days=n % days + 1)).isoformat(), NEWS_SOURCES[n % len(NEWS_SOURCES)],
+             f"{base_urls[n % len(base_urls)]}/articles/{n}.html")
+            for n in self.articles
+        ]
+
+
+def _parse_day(value):
+    return datetime.strptime(value, '%Y%m%d').date()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    data = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, payload):
+        self._send(200, json.dumps(payload).encode('utf-8'))
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+        path = parts.path
+
+        if path == '/cba/income':
+            per_page = int(query.get('per_page', 100))
+            page = int(query.get('page', 1))
+            window = self.data.cba_window(query.get('date_from'), query.get('date_to'))
+            rows = window[(page - 1) * per_page:page * per_page]
+            return self._json({'total_count': len(window), 'rows': rows})
+
+        if path == '/nbu/range':
+            return self._json(self.data.nbu_range(
+                query.get('valcode', '').upper(), _parse_day(query['start']), _parse_day(query['end'])
+            ))
+
+        if path == '/nbu/daily':
+            day = _parse_day(query['date'])
+            return self._json([self.data.nbu_record(cc, day) for cc in NBU_CURRENCIES])
+
+        if path == '/u24/reports':
+            links = ''.join(f'<li><a href="/u24/files/{name}">{name}</a></li>' for name in self.data.pdfs)
+            return self._send(200, f"<html><body><ul>{links}</ul></body></html>".encode('utf-8'), 'text/html')
+
+        if path.startswith('/u24/files/'):
+            report = self.data.pdfs.get(path.rsplit('/', 1)[-1])
+            if report is None:
+                return self._send(404)
+            content, etag, last_modified = report
+            validators = {'ETag': etag, 'Last-Modified': last_modified}
+            if self.headers.get('If-None-Match') == etag:
+                return self._send(304, headers=validators)
+            return self._send(200, content, 'application/pdf', validators)
+
+        if path.startswith('/articles/'):
+            try:
+                headline = self.data.articles[int(path.rsplit('/', 1)[-1].split('.')[0])]
+            except (ValueError, KeyError):
+                return self._send(404)
+            html = (f'<html><head><meta property="og:title" content="{headline}"><title>{headline}</title>'
+                    f'</head><body><h1>{headline}</h1>{"<p>Lorem ipsum.</p>" * 50}</body></html>')
+            return self._send(200, html.encode('utf-8'), 'text/html')
+
+        self._send(404)
+
+
+class StubServer:
+    """
+    Serves StubData on 127.0.0.1 from a background thread. Use as a context manager.
+    """
+
+    def __init__(self, data, port=0):
+        handler = type('BoundStubHandler', (StubHandler,), {'data': data})
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        # A second host name for the same socket, so articles span two domains
+        self.alt_base_url = f"http://localhost:{self.port}"
+
+    def scraper_env(self):
+        """
+        Environment overrides that point every scraper at this server.
+        """
+        return {
+            'CBA_API_URL': f"{self.base_url}/cba/income",
+            'NBU_RANGE_URL': f"{self.base_url}/nbu/range",
+            'NBU_DAILY_URL': f"{self.base_url}/nbu/daily",
+            'U24_SITE_URL': f"{self.base_url}/u24",
+        }
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def write_gdelt_fixture(data, server, path):
+    """
+    Writes the GDELT fixture CSV whose article URLs point at the stub server.
+    """
+    lines = ['event_date,source,url']
+    lines += [','.join(row) for row in data.gdelt_rows([server.base_url, server.alt_base_url])]
+    Path(path).write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return path
@@ -0,0 +1,280 @@
+import os
+import sys
+import logging
+import argparse
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    from statsmodels.tsa.seasonal import STL
+except ImportError:  # STL residuals are optional
+    STL = None
+
+# Donation anomaly detection over the daily EUR series of every foundation x currency.
+# Series are read from donation_rollup_daily and pivoted into one wide frame (days x series),
+# so the rolling detectors run over all series at once:
+#   robust_z  - trailing rolling median / MAD z-score
+#   weekday   - the same against the trailing median of the same weekday
+#   stl       - robust z-score of STL residuals (weekly seasonality), if statsmodels is installed
+# Consecutive flagged days are saved as windows in donation_anomalies. Runs are incremental:
+# only days from `since` are rescored, and windows still open at that point are extended.
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from utils.pg_ingest import bulk_insert, pooled_connection
+
+ROBUST_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.5"))
+ROLLING_WINDOW_DAYS = 28
+WEEKDAY_WINDOW_WEEKS = 8
+# Enough trailing history for every detector to have a full baseline on the first rescored day
+HISTORY_DAYS = 120
+RESCORE_DAYS = 7
+
+ANOMALY_COLUMNS = (
+    'foundation_name', 'currency', 'detector', 'window_start', 'window_end', 'days',
+    'peak_date', 'peak_value_eur', 'peak_baseline_eur', 'peak_score'
+)
+
+
+def init_anomaly_schema(conn):
+    """
+    Creates the flagged window table. Commits.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS donation_anomalies (
+            foundation_name TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            detector TEXT NOT NULL,
+            window_start DATE NOT NULL,
+            window_end DATE NOT NULL,
+            days INTEGER NOT NULL,
+            peak_date DATE NOT NULL,
+            peak_value_eur NUMERIC(18, 2),
+            peak_baseline_eur NUMERIC(18, 2),
+            peak_score REAL,
+            detected_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (foundation_name, currency, detector, window_start)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_donation_anomalies_window ON donation_anomalies (window_start, window_end)")
+    conn.commit()
+
+
+def load_daily_series(conn, date_from):
+    """
+    Returns a dense wide frame: one row per calendar day from `date_from` to the last stored day,
+    one column per (foundation_name, currency), EUR totals with missing days as 0.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT period_start, foundation_name, currency, SUM(total_eur)
+        FROM donation_rollup_daily
+        WHERE period_start >= %s
+        GROUP BY 1, 2, 3
+    ''', (date_from,))
+    rows = cursor.fetchall()
+    if not rows:
+        return pd.DataFrame()
+
+    long = pd.DataFrame(rows, columns=['date', 'foundation_name', 'currency', 'value'])
+    long['date'] = pd.to_datetime(long['date'])
+    long['value'] = long['value'].astype(float).fillna(0.0)
+
+    wide = long.pivot_table(index='date', columns=['foundation_name', 'currency'], values='value', aggfunc='sum')
+    days = pd.date_range(pd.Timestamp(date_from), wide.index.max(), freq='D')
+    return wide.reindex(days).fillna(0.0)
+
+
+def _robust_scale(deviation, baseline, level):
+    # 1.4826 * MAD estimates sigma. The floor, relative to the baseline and the mean level,
+    # keeps intermittent (mostly zero) series from turning every donation into an outlier.
+    scale = 1.4826 * deviation
+    return np.maximum(scale, np.maximum(0.1 * np.maximum(baseline.abs(), level.abs()), 1.0))
+
+
+def robust_z_scores(wide):
+    """
+    Trailing rolling median / MAD z-score for every series at once.
+    Day t is compared with the ROLLING_WINDOW_DAYS before it (t itself excluded).
+    """
+    rolling = wide.rolling(ROLLING_WINDOW_DAYS, min_periods=ROLLING_WINDOW_DAYS // 2)
+    baseline = rolling.median().shift(1)
+    level = rolling.mean().shift(1)
+    deviation = (wide - baseline).abs().rolling(ROLLING_WINDOW_DAYS, min_periods=ROLLING_WINDOW_DAYS // 2).median().shift(1)
+    return (wide - baseline) / _robust_scale(deviation, baseline, level), baseline
+
+
+def weekday_z_scores(wide):
+    """
+    Weekday-aware baseline: each day is compared with the same weekday of the
+    previous WEEKDAY_WINDOW_WEEKS weeks, so weekly donation cycles are not flagged.
+    """
+    scores = pd.DataFrame(index=wide.index, columns=wide.columns, dtype=float)
+    baselines = pd.DataFrame(index=wide.index, columns=wide.columns, dtype=float)
+    min_periods = WEEKDAY_WINDOW_WEEKS // 2
+
+    for weekday in range(7):
+        same_day = wide[wide.index.weekday == weekday]
+        rolling = same_day.rolling(WEEKDAY_WINDOW_WEEKS, min_periods=min_periods)
+        baseline = rolling.median().shift(1)
+        level = rolling.mean().shift(1)
+        deviation = (same_day - baseline).abs().rolling(WEEKDAY_WINDOW_WEEKS, min_periods=min_periods).median().shift(1)
+        scores.loc[same_day.index] = (same_day - baseline) / _robust_scale(deviation, baseline, level)
+        baselines.loc[same_day.index] = baseline
+
+    return scores, baselines
+
+
+def stl_z_scores(wide):
+    """
+    Robust z-score of STL residuals with weekly seasonality. Returns (None, None) without statsmodels.
+    """
+    if STL is None or len(wide) < 3 * 7:
+        return None, None
+
+    scores = pd.DataFrame(index=wide.index, columns=wide.columns, dtype=float)
+    baselines = pd.DataFrame(index=wide.index, columns=wide.columns, dtype=float)
+    for column in wide.columns:
+        fit = STL(wide[column], period=7, robust=True).fit()
+        residual = fit.resid
+        mad = (residual - residual.median()).abs().median()
+        baselines[column] = fit.trend + fit.seasonal
+        level = pd.Series(wide[column].abs().mean(), index=residual.index)
+        scores[column] = residual / _robust_scale(pd.Series(mad, index=residual.index), baselines[column], level)
+
+    return scores, baselines
+
+
+def flag_days(wide, score_from):
+    """
+    Runs every detector and returns one row per flagged (series, detector, day) from `score_from`.
+    """
+    detectors = {
+        'robust_z': robust_z_scores(wide),
+        'weekday': weekday_z_scores(wide),
+        'stl': stl_z_scores(wide),
+    }
+
+    frames = []
+    for name, (scores, baselines) in detectors.items():
+        if scores is None:
+            continue
+
+        mask = scores.abs() >= ROBUST_Z_THRESHOLD
+        mask.loc[mask.index < pd.Timestamp(score_from)] = False
+        if not mask.values.any():
+            continue
+
+        stacked = pd.DataFrame({
+            'score': scores.where(mask).stack(['foundation_name', 'currency']),
+            'value': wide.where(mask).stack(['foundation_name', 'currency']),
+            'baseline': baselines.where(mask).stack(['foundation_name', 'currency']),
+        }).dropna(subset=['score'])
+        stacked['detector'] = name
+        frames.append(stacked)
+
+    if not frames:
+        return pd.DataFrame()
+
+    flagged = pd.concat(frames).rename_axis(['date', 'foundation_name', 'currency']).reset_index()
+    return flagged
+
+
+def build_windows(flagged):
+    """
+    Merges consecutive flagged days of the same series and detector into windows.
+    The peak is the day with the largest absolute score.
+    """
+    if flagged.empty:
+        return []
+
+    keys = ['foundation_name', 'currency', 'detector']
+    flagged = flagged.sort_values(keys + ['date'])
+    gap = flagged.groupby(keys)['date'].diff() != pd.Timedelta(days=1)
+    flagged['window_id'] = gap.cumsum()
+
+    flagged['abs_score'] = flagged['score'].abs()
+    peaks = flagged.loc[flagged.groupby('window_id')['abs_score'].idxmax()].set_index('window_id')
+    bounds = flagged.groupby('window_id')['date'].agg(['min', 'max', 'count'])
+    windows = peaks.join(bounds)
+
+    return [
+        (r.foundation_name, r.currency, r.detector, r.min.date(), r.max.date(), int(r.count),
+         r.date.date(), round(float(r.value), 2), round(float(r.baseline), 2), round(float(r.score), 3))
+        for r in windows.itertuples()
+    ]
+
+
+def detect_anomalies(since=None):
+    """
+    Entry point for the DAG: rescores days from `since` (default: the last RESCORE_DAYS days)
+    and replaces the affected windows in one transaction. Returns the number of windows saved.
+    """
+    since = date.fromisoformat(str(since)[:10]) if since else date.today() - timedelta(days=RESCORE_DAYS)
+
+    with pooled_connection() as conn:
+        init_anomaly_schema(conn)
+        cursor = conn.cursor()
+
+        # Windows touching the rescored range are rebuilt from their start, so they can grow
+        cursor.execute('''
+            SELECT foundation_name, currency, detector, MIN(window_start)
+            FROM donation_anomalies
+            WHERE window_end >= %s::date - 1
+            GROUP BY 1, 2, 3
+        ''', (since,))
+        reopened = {(f, c, d): start for f, c, d, start in cursor.fetchall()}
+        score_from = min([since, *reopened.values()])
+
+        wide = load_daily_series(conn, score_from - timedelta(days=HISTORY_DAYS))
+        if wide.empty:
+            logging.info("No daily rollups stored yet. Anomaly detection skipped.")
+            return 0
+
+        flagged = flag_days(wide, score_from)
+        if not flagged.empty:
+            # Days before a series' own rescore start belong to windows that stay untouched
+            starts = flagged.apply(
+                lambda r: reopened.get((r.foundation_name, r.currency, r.detector), since), axis=1
+            )
+            flagged = flagged[flagged['date'].dt.date >= starts]
+
+        windows = build_windows(flagged)
+
+        try:
+            cursor.execute("DELETE FROM donation_anomalies WHERE window_end >= %s::date - 1", (since,))
+            saved = bulk_insert(
+                'donation_anomalies', ANOMALY_COLUMNS, windows,
+                conflict_columns=ANOMALY_COLUMNS[:3] + ('window_start',),
+                update_columns=ANOMALY_COLUMNS[4:], conn=conn
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    logging.info(f"Anomaly detection from {since}: {len(wide.columns)} series, "
+                 f"{len(flagged)} flagged days, {saved} windows saved")
+    return saved
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        stream=sys.stderr
+    )
+
+    parser = argparse.ArgumentParser(description="Detect donation anomalies from the daily rollups")
+    parser.add_argument('--since', help=f"First day to rescore (YYYY-MM-DD). Default: last {RESCORE_DAYS} days")
+    args = parser.parse_args()
+
+    # Technical Note: Final stdout line consumed by the alerting bot
+    print(detect_anomalies(args.since))
@@ -0,0 +1,150 @@
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Ingest-time currency conversion.
+# Keeps a forward-filled daily rate series per currency (weekends and holidays carry the
+# last published NBU rate) and stores converted amounts on `donations`, so analytical
+# loads are plain scans instead of a per-query join against exchange_rates.
+# Technical Note: `amount` is stored in the donation's own `currency` (UAH for most rows, USD/EUR/...
+# for some CBA transfers), so conversion goes through UAH: amount * rate(source) / rate(target).
+# Rows whose source currency has no NBU rate keep a NULL converted amount.
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from utils.pg_ingest import pooled_connection
+
+# Stored column -> NBU currency code it is converted into
+CONVERSION_TARGETS = {
+    'amount_eur': 'EUR',
+    'amount_usd': 'USD',
+}
+
+
+def init_conversion_schema(conn):
+    """
+    Creates the filled rate table and the converted amount columns. Commits.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS exchange_rates_filled (
+            date DATE NOT NULL,
+            currency TEXT NOT NULL,
+            rate_uah REAL,
+            source_date DATE,
+            PRIMARY KEY (date, currency)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_exchange_rates_currency_date ON exchange_rates (currency, date)")
+
+    for column in CONVERSION_TARGETS:
+        cursor.execute(f"ALTER TABLE donations ADD COLUMN IF NOT EXISTS {column} NUMERIC(14, 2)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_donations_date ON donations (date)")
+    conn.commit()
+
+
+def refresh_filled_rates(conn, since):
+    """
+    Rebuilds the forward-filled series from `since` up to today for every currency.
+    Each calendar day takes the latest rate published on or before it.
+    Returns the number of (date, currency) rows written.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO exchange_rates_filled (date, currency, rate_uah, source_date)
+        SELECT d::date, c.currency, r.rate_uah, r.date
+        FROM generate_series(%s::date, CURRENT_DATE, INTERVAL '1 day') AS d
+        CROSS JOIN (SELECT DISTINCT currency FROM exchange_rates) AS c
+        CROSS JOIN LATERAL (
+            SELECT er.rate_uah, er.date
+            FROM exchange_rates er
+            WHERE er.currency = c.currency AND er.date <= d::date
+            ORDER BY er.date DESC
+            LIMIT 1
+        ) AS r
+        ON CONFLICT (date, currency) DO UPDATE
+        SET rate_uah = EXCLUDED.rate_uah,
+            source_date = EXCLUDED.source_date
+    ''', (since,))
+    return cursor.rowcount
+
+
+def backfill_converted_amounts(conn, since):
+    """
+    Recomputes stored amounts for donations dated on or after `since`.
+    Each amount is converted from its own currency via UAH (UAH itself has rate 1);
+    without a source rate the converted amount is NULL.
+    Rows whose value would not change are left untouched.
+    Returns {column: rows_updated}.
+    """
+    cursor = conn.cursor()
+    updated = {}
+
+    for column, currency in CONVERSION_TARGETS.items():
+        cursor.execute(f'''
+            UPDATE donations d
+            SET {column} = c.converted
+            FROM (
+                SELECT dn.id,
+                       ROUND((dn.amount * CASE WHEN UPPER(COALESCE(dn.currency, 'UAH')) = 'UAH' THEN 1
+                                               ELSE src.rate_uah END
+                              / NULLIF(tgt.rate_uah, 0))::numeric, 2) AS converted
+                FROM donations dn
+                JOIN exchange_rates_filled tgt
+                  ON tgt.currency = %(target)s AND tgt.date = dn.date::date
+                LEFT JOIN exchange_rates_filled src
+                  ON src.currency = UPPER(dn.currency) AND src.date = dn.date::date
+                WHERE dn.date >= %(since)s::date
+            ) AS c
+            WHERE d.id = c.id
+              AND d.{column} IS DISTINCT FROM c.converted
+        ''', {'target': currency, 'since': since})
+        updated[column] = cursor.rowcount
+
+    return updated
+
+
+def apply_conversions(since=None):
+    """
+    Entry point for ingest scripts: refreshes filled rates and converted amounts
+    from `since` (YYYY-MM-DD) onwards in one transaction.
+    Without `since` the whole rate history is reprocessed.
+    """
+    with pooled_connection() as conn:
+        init_conversion_schema(conn)
+
+        if since is None:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MIN(date) FROM exchange_rates")
+            since = cursor.fetchone()[0]
+            if since is None:
+                logging.warning("No exchange rates stored yet. Conversion skipped.")
+                return {}
+
+        try:
+            filled = refresh_filled_rates(conn, since)
+            updated = backfill_converted_amounts(conn, since)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    logging.info(f"Conversion since {since}: {filled} filled rates, updated {updated}")
+    return updated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+    parser = argparse.ArgumentParser(description="Backfill forward-filled rates and stored EUR/USD amounts")
+    parser.add_argument('--since', help="First date to reprocess (YYYY-MM-DD). Default: full history")
+    args = parser.parse_args()
+
+    apply_conversions(args.since)
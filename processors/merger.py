@@ -1,8 +1,12 @@
 import sqlite3
-import pandas as pd
 import os
+import sys
 import glob
+import hashlib
 import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Logger configuration
 logging.basicConfig(
@@ -16,6 +20,172 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 RAW_DIR = os.path.join(BASE_DIR, 'data', 'raw')
 MASTER_DB_PATH = os.path.join(BASE_DIR, 'data', 'master', 'master.db')
 
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from utils import instrumentation
+
+# Columns shared by the raw monthly databases and the master table
+SOURCE_COLUMNS = ('id', 'amount', 'currency', 'date', 'comment', 'source')
+
+# Technical Note: merges of different foundations queue on SQLite's single writer lock
+BUSY_TIMEOUT_SECONDS = 300
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def open_master_db():
+    """
+    Opens master.db in autocommit mode so transactions are managed explicitly
+    (ATTACH/DETACH are not allowed inside an open transaction).
+    """
+    os.makedirs(os.path.dirname(MASTER_DB_PATH), exist_ok=True)
+
+    conn = sqlite3.connect(MASTER_DB_PATH, isolation_level=None, timeout=BUSY_TIMEOUT_SECONDS)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def ensure_master_schema(conn):
+    """
+    Creates the master donations table and the unique id index used for deduplication.
+    Masters built by the old pandas append path may already hold duplicate ids;
+    those are collapsed to their first copy before the index is built.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS donations (
+            id INTEGER,
+            amount REAL,
+            currency TEXT,
+            date TEXT,
+            comment TEXT,
+            source TEXT,
+            foundation_name TEXT
+        )
+    ''')
+
+    try:
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_donations_id ON donations (id)")
+    except sqlite3.IntegrityError:
+        logging.warning("Duplicate ids found in master database. Collapsing them before indexing...")
+        cursor = conn.execute('''
+            DELETE FROM donations
+            WHERE id IS NOT NULL
+              AND rowid NOT IN (SELECT MIN(rowid) FROM donations WHERE id IS NOT NULL GROUP BY id)
+        ''')
+        logging.info(f"Removed {cursor.rowcount} duplicate rows.")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_donations_id ON donations (id)")
+
+    # One row per merged raw file; unchanged files are skipped on later runs
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS merge_manifest (
+            path TEXT PRIMARY KEY,
+            foundation_name TEXT,
+            size INTEGER,
+            mtime REAL,
+            sha256 TEXT,
+            row_count INTEGER,
+            max_id INTEGER,
+            merged_at TEXT
+        )
+    ''')
+
+
+def file_sha256(path):
+    """
+    Streams a file through SHA-256 in 1 MB chunks.
+    """
+    digest = hashlib.sha256()
+    with instrumentation.timed('file_hash'), open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest_entry(conn, rel_path):
+    cursor = conn.execute(
+        "SELECT size, mtime, sha256, row_count, max_id FROM merge_manifest WHERE path = ?", (rel_path,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return dict(zip(('size', 'mtime', 'sha256', 'row_count', 'max_id'), row))
+
+
+def merge_file(conn_master, db_file, folder_name, manifest_entry=None, file_stat=None, sha256=None):
+    """
+    Copies one raw database into master.db inside SQLite, without loading it into Python.
+    INSERT OR IGNORE ... SELECT streams rows in constant memory and skips known ids.
+
+    When the manifest shows the file was merged before and every previously merged
+    id is still present unchanged in count, only rows above the recorded max id are read.
+    The manifest row is written in the same transaction as the data.
+    Returns the number of rows actually inserted.
+    """
+    rel_path = os.path.relpath(db_file, RAW_DIR)
+
+    conn_master.execute("ATTACH DATABASE ? AS src", (db_file,))
+    try:
+        columns = ', '.join(SOURCE_COLUMNS)
+        row_count, max_id = conn_master.execute("SELECT COUNT(*), MAX(id) FROM src.donations").fetchone()
+
+        delta_filter, params = '', (folder_name,)
+        if manifest_entry and manifest_entry['max_id'] is not None:
+            kept = conn_master.execute(
+                "SELECT COUNT(*) FROM src.donations WHERE id <= ?", (manifest_entry['max_id'],)
+            ).fetchone()[0]
+            if kept == manifest_entry['row_count']:
+                delta_filter, params = 'WHERE id > ?', (folder_name, manifest_entry['max_id'])
+                logging.info(f"{rel_path}: delta merge of {row_count - kept} rows above id {manifest_entry['max_id']}")
+
+        conn_master.execute("BEGIN")
+        cursor = conn_master.execute(f'''
+            INSERT OR IGNORE INTO main.donations ({columns}, foundation_name)
+            SELECT {columns}, ? FROM src.donations {delta_filter}
+        ''', params)
+        inserted = cursor.rowcount
+
+        file_stat = file_stat or os.stat(db_file)
+        conn_master.execute('''
+            INSERT OR REPLACE INTO merge_manifest
+                (path, foundation_name, size, mtime, sha256, row_count, max_id, merged_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (rel_path, folder_name, file_stat.st_size, file_stat.st_mtime,
+              sha256 or file_sha256(db_file), row_count, max_id, datetime.now().isoformat(timespec='seconds')))
+        conn_master.execute("COMMIT")
+        return inserted
+    except Exception:
+        if conn_master.in_transaction:
+            conn_master.execute("ROLLBACK")
+        raise
+    finally:
+        conn_master.execute("DETACH DATABASE src")
+
+
+def plan_file(conn_master, db_file):
+    """
+    Decides whether a raw file needs merging.
+    Size + mtime match -> skip without reading; otherwise the content hash decides.
+    Returns (needs_merge, manifest_entry, stat, sha256).
+    """
+    rel_path = os.path.relpath(db_file, RAW_DIR)
+    file_stat = os.stat(db_file)
+    entry = load_manifest_entry(conn_master, rel_path)
+
+    if entry and entry['size'] == file_stat.st_size and entry['mtime'] == file_stat.st_mtime:
+        return False, entry, file_stat, entry['sha256']
+
+    sha256 = file_sha256(db_file)
+    if entry and entry['sha256'] == sha256:
+        # Touched but identical: refresh the stat fingerprint only
+        conn_master.execute(
+            "UPDATE merge_manifest SET size = ?, mtime = ? WHERE path = ?",
+            (file_stat.st_size, file_stat.st_mtime, rel_path)
+        )
+        return False, entry, file_stat, sha256
+
+    return True, entry, file_stat, sha256
+
 
 def merge_specific_foundation(folder_name):
     """
@@ -25,51 +195,45 @@ def merge_specific_foundation(folder_name):
 
     if not os.path.exists(target_folder):
         logging.error(f"Directory not found: {target_folder}")
-        return
+        return 0
 
     logging.info(f"--- STARTING MERGE FOR FOUNDATION: {folder_name} ---")
 
-    # Ensure master directory exists
-    os.makedirs(os.path.dirname(MASTER_DB_PATH), exist_ok=True)
-
-    # Connect to master database
-    conn_master = sqlite3.connect(MASTER_DB_PATH)
-    total_rows = 0
-
     # Find all .db files in the target folder
-    db_files = glob.glob(os.path.join(target_folder, "*.db"))
+    db_files = sorted(glob.glob(os.path.join(target_folder, "*.db")))
 
     if not db_files:
         logging.warning(f"No .db files found in {folder_name}. Skipping.")
-        conn_master.close()
-        return
+        return 0
+
+    # Connect to master database
+    conn_master = open_master_db()
+    ensure_master_schema(conn_master)
+    total_rows = 0
+    skipped_files = 0
 
     for db_file in db_files:
         filename = os.path.basename(db_file)
-        logging.info(f"Processing file: {filename}")
 
         try:
-            conn_temp = sqlite3.connect(db_file)
-            # Read source table
-            df = pd.read_sql_query("SELECT * FROM donations", conn_temp)
-            conn_temp.close()
-
-            if df.empty:
-                logging.info(f"File {filename} is empty. Skipping.")
+            needs_merge, entry, file_stat, sha256 = plan_file(conn_master, db_file)
+            if not needs_merge:
+                skipped_files += 1
+                instrumentation.count('merge_files_skipped', foundation=folder_name)
                 continue
 
-            # Tag data with foundation name
-            df['foundation_name'] = folder_name
-
-            # Append to master table
-            df.to_sql('donations', conn_master, if_exists='append', index=False)
-
-            rows_in_file = len(df)
+            logging.info(f"Processing file: {folder_name}/{filename}")
+            with instrumentation.timed('sqlite_merge', foundation=folder_name):
+                rows_in_file = merge_file(conn_master, db_file, folder_name, entry, file_stat, sha256)
+            instrumentation.count('db_rows_inserted', rows_in_file, table='master.donations')
             total_rows += rows_in_file
-            logging.info(f"Successfully added {rows_in_file} rows.")
+            logging.info(f"Successfully added {rows_in_file} new rows.")
 
         except Exception as e:
-            logging.error(f"Error reading {filename}: {e}")
+            logging.error(f"Error merging {filename}: {e}")
+            instrumentation.count('merge_files_failed', foundation=folder_name)
+
+    logging.info(f"{folder_name}: {skipped_files}/{len(db_files)} files unchanged since last merge.")
 
     # Performance optimization: creating indexes
     logging.info("Optimizing master database indexes...")
@@ -85,9 +249,43 @@ def merge_specific_foundation(folder_name):
     conn_master.close()
     logging.info(f"--- FINISHED: {folder_name} ---")
     logging.info(f"Total new records added: {total_rows}")
+    return total_rows
+
+
+def discover_foundations():
+    """
+    Lists subdirectories of data/raw/ that contain raw .db files.
+    """
+    if not os.path.exists(RAW_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(RAW_DIR)
+        if glob.glob(os.path.join(RAW_DIR, name, "*.db"))
+    )
+
+
+def merge_foundations(folder_names, workers=4):
+    """
+    Merges several foundations concurrently. Hashing and planning run in parallel;
+    the actual writes queue on master.db's writer lock.
+    """
+    total_rows = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(merge_specific_foundation, name): name for name in folder_names}
+        for future in as_completed(futures):
+            try:
+                total_rows += future.result() or 0
+            except Exception as e:
+                logging.error(f"Merge of {futures[future]} failed: {e}")
+
+    logging.info(f"All foundations merged. Total new records added: {total_rows}")
+    return total_rows
 
 
 if __name__ == "__main__":
-    # Target folder name in data/raw/
-    TARGET = 'come_back_alive'
-    merge_specific_foundation(TARGET)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Incremental merge of data/raw/<foundation>/*.db into master.db")
+    parser.add_argument('foundations', nargs='*', help="Folder names in data/raw/ (default: all with .db files)")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    merge_foundations(args.foundations or discover_foundations(), args.workers)
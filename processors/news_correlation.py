@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import logging
+import argparse
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from pathlib import Path
+
+# Links donation anomaly windows to the news published around them.
+# All windows of a run are matched in one pass: the news for the union of their ranges is
+# read once (ordered by the (date, source) index) and each window takes its slice with bisect,
+# widened by LEAD_DAYS before the window and LAG_DAYS after it. Matches are ranked by distance
+# to the window's peak day and stored in anomaly_news_matches.
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from utils.pg_ingest import bulk_insert, pooled_connection
+
+LEAD_DAYS = int(os.getenv("NEWS_LEAD_DAYS", "3"))
+LAG_DAYS = int(os.getenv("NEWS_LAG_DAYS", "1"))
+RECORRELATE_DAYS = 7
+
+WINDOW_KEY = ('foundation_name', 'currency', 'detector', 'window_start')
+MATCH_COLUMNS = WINDOW_KEY + ('news_date', 'source', 'offset_days', 'rank', 'headline')
+
+
+def init_correlation_schema(conn):
+    """
+    Creates the match table and the news index used for range reads. Commits.
+    """
+    cursor = conn.cursor()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_date_source ON news (date, source)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS anomaly_news_matches (
+            foundation_name TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            detector TEXT NOT NULL,
+            window_start DATE NOT NULL,
+            news_date DATE NOT NULL,
+            source TEXT NOT NULL,
+            offset_days INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            headline TEXT NOT NULL,
+            PRIMARY KEY (foundation_name, currency, detector, window_start, rank)
+        )
+    ''')
+    conn.commit()
+
+
+def load_windows(cursor, since):
+    """
+    Anomaly windows ending on or after `since`, as (key, window_start, window_end, peak_date).
+    """
+    cursor.execute(f'''
+        SELECT {', '.join(WINDOW_KEY)}, window_end, peak_date
+        FROM donation_anomalies
+        WHERE window_end >= %s
+        ORDER BY window_start
+    ''', (since,))
+    return [(row[:4], row[3], row[4], row[5]) for row in cursor.fetchall()]
+
+
+def load_news(cursor, date_from, date_to):
+    """
+    Returns (dates, items): parallel lists sorted by date, one item per headline
+    as (news_date, source, headline).
+    """
+    cursor.execute('''
+        SELECT date::date, source, headers
+        FROM news
+        WHERE date >= %s AND date <= %s
+        ORDER BY date, source
+    ''', (date_from.isoformat(), date_to.isoformat()))
+
+    dates, items = [], []
+    for news_date, source, headers in cursor.fetchall():
+        headlines = json.loads(headers) if isinstance(headers, str) else (headers or [])
+        for headline in headlines:
+            if headline:
+                dates.append(news_date)
+                items.append((news_date, source, headline))
+    return dates, items
+
+
+def match_windows(windows, dates, items, lead_days=LEAD_DAYS, lag_days=LAG_DAYS):
+    """
+    Sorted-merge step: for every window, the headlines dated in
+    [window_start - lead_days, window_end + lag_days], ranked by distance to the peak day.
+    Returns rows shaped like MATCH_COLUMNS.
+    """
+    rows = []
+    for key, window_start, window_end, peak_date in windows:
+        lo = bisect_left(dates, window_start - timedelta(days=lead_days))
+        hi = bisect_right(dates, window_end + timedelta(days=lag_days))
+
+        # Stable sort keeps the (date, source) order among headlines equally close to the peak
+        matches = sorted(items[lo:hi], key=lambda item: abs((item[0] - peak_date).days))
+        for rank, (news_date, source, headline) in enumerate(matches, start=1):
+            rows.append((*key, news_date, source, (news_date - peak_date).days, rank, headline))
+    return rows
+
+
+def correlate_anomalies(since=None, lead_days=LEAD_DAYS, lag_days=LAG_DAYS):
+    """
+    Entry point for the DAG: re-matches every window ending on or after `since`
+    (default: the last RECORRELATE_DAYS days, widened by lag_days for late news)
+    and drops matches of windows that no longer exist. Returns the number of matches saved.
+    """
+    since = date.fromisoformat(str(since)[:10]) if since else date.today() - timedelta(days=RECORRELATE_DAYS)
+    since -= timedelta(days=lag_days)
+
+    with pooled_connection() as conn:
+        init_correlation_schema(conn)
+        cursor = conn.cursor()
+
+        windows = load_windows(cursor, since)
+        rows = []
+        if windows:
+            news_from = min(w[1] for w in windows) - timedelta(days=lead_days)
+            news_to = max(w[2] for w in windows) + timedelta(days=lag_days)
+            dates, items = load_news(cursor, news_from, news_to)
+            rows = match_windows(windows, dates, items, lead_days, lag_days)
+
+        key_columns = ', '.join(WINDOW_KEY)
+        try:
+            cursor.execute(f'''
+                DELETE FROM anomaly_news_matches m
+                WHERE ({key_columns}) IN (
+                    SELECT {key_columns} FROM donation_anomalies WHERE window_end >= %s
+                )
+                OR NOT EXISTS (
+                    SELECT 1 FROM donation_anomalies a
+                    WHERE (a.foundation_name, a.currency, a.detector, a.window_start)
+                        = (m.foundation_name, m.currency, m.detector, m.window_start)
+                )
+            ''', (since,))
+            saved = bulk_insert('anomaly_news_matches', MATCH_COLUMNS, rows,
+                                conflict_columns=WINDOW_KEY + ('rank',), update_columns=MATCH_COLUMNS[4:],
+                                conn=conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    logging.info(f"News correlation from {since}: {len(windows)} windows, {saved} headline matches "
+                 f"(lead {lead_days}d, lag {lag_days}d)")
+    return saved
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        stream=sys.stderr
+    )
+
+    parser = argparse.ArgumentParser(description="Match donation anomaly windows with news headlines")
+    parser.add_argument('--since', help=f"Re-match windows ending from this day (YYYY-MM-DD). "
+                                        f"Default: last {RECORRELATE_DAYS} days")
+    parser.add_argument('--lead', type=int, default=LEAD_DAYS, help="Days of news before a window")
+    parser.add_argument('--lag', type=int, default=LAG_DAYS, help="Days of news after a window")
+    args = parser.parse_args()
+
+    # Technical Note: Final stdout line consumed by the alerting bot
+    print(correlate_anomalies(args.since, args.lead, args.lag))
@@ -0,0 +1,121 @@
+import os
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Pre-aggregated donation rollups for dashboards and notebooks.
+# donation_rollup_daily and donation_rollup_weekly hold one row per
+# period x foundation x category x currency with totals, counts and a whale split
+# (donations of at least WHALE_THRESHOLD_EUR). Ingest scripts refresh only the periods
+# their run touched, so readers scan a few thousand rows instead of the raw table.
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from utils.pg_ingest import pooled_connection
+
+WHALE_THRESHOLD_EUR = float(os.getenv("WHALE_THRESHOLD_EUR", "10000"))
+
+# Rollup table -> date_trunc unit of its period (weeks start on Monday)
+ROLLUP_PERIODS = {
+    'donation_rollup_daily': 'day',
+    'donation_rollup_weekly': 'week',
+}
+
+
+def init_rollup_schema(conn):
+    """
+    Creates both rollup tables. Commits.
+    Missing categories and currencies are stored as '' so they can be part of the key.
+    """
+    cursor = conn.cursor()
+    for table in ROLLUP_PERIODS:
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                period_start DATE NOT NULL,
+                foundation_name TEXT NOT NULL,
+                category TEXT NOT NULL,
+                currency TEXT NOT NULL,
+                donation_count INTEGER NOT NULL,
+                total_amount NUMERIC(18, 2),
+                total_eur NUMERIC(18, 2),
+                whale_count INTEGER NOT NULL,
+                whale_eur NUMERIC(18, 2),
+                PRIMARY KEY (period_start, foundation_name, category, currency)
+            )
+        ''')
+    conn.commit()
+
+
+def refresh_rollup(conn, table, since, until=None):
+    """
+    Recomputes every period of `table` that overlaps [since, until] from the raw rows.
+    Periods are deleted and re-inserted, so rows that disappeared are handled too.
+    Returns the number of rollup rows written.
+    """
+    unit = ROLLUP_PERIODS[table]
+    cursor = conn.cursor()
+
+    # Widen the range to whole periods (a touched Wednesday refreshes its whole week)
+    cursor.execute(f'''
+        SELECT date_trunc('{unit}', %s::date)::date,
+               date_trunc('{unit}', COALESCE(%s::date, CURRENT_DATE))::date
+    ''', (since, until))
+    period_from, period_to = cursor.fetchone()
+
+    cursor.execute(f"DELETE FROM {table} WHERE period_start BETWEEN %s AND %s", (period_from, period_to))
+    cursor.execute(f'''
+        INSERT INTO {table} (period_start, foundation_name, category, currency, donation_count,
+                             total_amount, total_eur, whale_count, whale_eur)
+        SELECT date_trunc('{unit}', d.date::date)::date AS period_start,
+               d.foundation_name,
+               COALESCE(d.category, ''),
+               COALESCE(d.currency, ''),
+               COUNT(*),
+               SUM(d.amount::numeric),
+               SUM(d.amount_eur),
+               COUNT(*) FILTER (WHERE d.amount_eur >= %(whale)s),
+               COALESCE(SUM(d.amount_eur) FILTER (WHERE d.amount_eur >= %(whale)s), 0)
+        FROM donations d
+        WHERE d.date::date >= %(period_from)s
+          AND d.date::date < %(period_to)s::date + INTERVAL '1 {unit}'
+          AND d.foundation_name IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    ''', {'whale': WHALE_THRESHOLD_EUR, 'period_from': period_from, 'period_to': period_to})
+    return cursor.rowcount
+
+
+def refresh_rollups(since, until=None):
+    """
+    Entry point for ingest scripts: refreshes daily and weekly rollups for the dates
+    from `since` (YYYY-MM-DD) to `until` (default: today) in one transaction.
+    Call after apply_conversions(), since the whale split uses stored EUR amounts.
+    """
+    with pooled_connection() as conn:
+        init_rollup_schema(conn)
+        try:
+            written = {table: refresh_rollup(conn, table, since, until) for table in ROLLUP_PERIODS}
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    logging.info(f"Rollups refreshed from {since} to {until or 'today'}: {written}")
+    return written
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+    parser = argparse.ArgumentParser(description="Rebuild donation rollups for a date range")
+    parser.add_argument('--since', required=True, help="First date to refresh (YYYY-MM-DD)")
+    parser.add_argument('--until', help="Last date to refresh (YYYY-MM-DD). Default: today")
+    args = parser.parse_args()
+
+    refresh_rollups(args.since, args.until)
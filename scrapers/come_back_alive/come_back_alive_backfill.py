@@ -0,0 +1,280 @@
+import os
+import sys
+import time
+import math
+import random
+import logging
+import argparse
+import datetime
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Historical backfill straight into the Postgres `donations` table.
+# Replaces the monthly SQLite files of come_back_alive_2025_data.py and the
+# processors/merger.py step that followed them.
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from scrapers.come_back_alive.come_back_alive_live_scraper import (
+    API_URL, RECORDS_PER_PAGE, DAY_END_SUFFIX, DONATION_COLUMNS, create_scraper, prepare_rows
+)
+from utils.pg_ingest import bulk_insert, pooled_connection, close_pool
+from utils.ingest_checkpoints import init_checkpoints, load_checkpoint, save_checkpoint
+from processors.currency_conversion import apply_conversions
+from processors.rollups import refresh_rollups
+from utils.run_metrics import RunMetrics
+from utils import instrumentation
+
+# Constants
+CHECKPOINT_JOB = 'cba_backfill'
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 2.0  # requests per second across ALL worker processes
+MAX_PAGE_RETRIES = 8
+
+# Per-process state, populated by the pool initializer
+_limiter = None
+_scraper = None
+
+
+class GlobalRateLimiter:
+    """
+    Spaces requests from every worker process to at most `rate` per second.
+    A 429 pushes the shared schedule forward, so all shards back off together.
+    """
+
+    def __init__(self, lock, next_slot, rate):
+        self._lock = lock
+        self._next_slot = next_slot
+        self._interval = 1.0 / rate
+
+    def acquire(self):
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot.value)
+            self._next_slot.value = slot + self._interval
+
+        delay = slot - now
+        if delay > 0:
+            instrumentation.count_sleep('rate_limit', delay)
+            time.sleep(delay)
+
+    def backoff(self, seconds):
+        with self._lock:
+            self._next_slot.value = max(self._next_slot.value, time.time() + seconds)
+
+
+def _init_worker(lock, next_slot, rate):
+    global _limiter
+    _limiter = GlobalRateLimiter(lock, next_slot, rate)
+
+
+def _get_scraper():
+    """
+    One cloudscraper session per worker process, reused across its shards.
+    """
+    global _scraper
+    if _scraper is None:
+        _scraper = create_scraper()
+    return _scraper
+
+
+def build_shards(date_from, date_to, shard_size='month'):
+    """
+    Splits an inclusive date range into calendar month or ISO week shards.
+    Returns a list of (first_day, last_day) date tuples.
+    """
+    shards = []
+    start = date_from
+
+    while start <= date_to:
+        if shard_size == 'week':
+            end = start + datetime.timedelta(days=6 - start.weekday())
+        else:
+            next_month = (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+            end = next_month - datetime.timedelta(days=1)
+
+        end = min(end, date_to)
+        shards.append((start, end))
+        start = end + datetime.timedelta(days=1)
+
+    return shards
+
+
+def fetch_page(params, page, metrics):
+    """
+    Fetches one page under the global rate limit. Returns the decoded payload.
+    Transient failures are retried; the shard fails after MAX_PAGE_RETRIES.
+    """
+    scraper = _get_scraper()
+    page_params = dict(params, page=page)
+
+    for attempt in range(1, MAX_PAGE_RETRIES + 1):
+        with metrics.stage('rate_limit_wait'):
+            _limiter.acquire()
+        try:
+            with metrics.stage('http'), instrumentation.timed('http_request', target='cba_income'):
+                res = scraper.get(API_URL, params=page_params)
+            metrics.observe_response(res)
+            instrumentation.count_response('cba_income', res)
+        except Exception as e:
+            logging.error(f"Connection error on page {page}: {e}. Retrying...")
+            instrumentation.count('http_errors', target='cba_income')
+            instrumentation.count_sleep('retry', 10)
+            time.sleep(10)
+            continue
+
+        if res.status_code == 200:
+            return res.json()
+
+        if res.status_code == 429:
+            wait = random.randint(45, 90)
+            logging.warning(f"Rate limited. All workers wait {wait}s...")
+            _limiter.backoff(wait)
+        elif res.status_code == 504:
+            logging.warning("Gateway timeout. Retrying in 15s...")
+            instrumentation.count_sleep('retry', 15)
+            time.sleep(15)
+        else:
+            logging.error(f"Error {res.status_code} on page {page} (attempt {attempt}). Retrying in 30s...")
+            instrumentation.count_sleep('retry', 30)
+            time.sleep(30)
+
+    raise RuntimeError(f"Page {page} failed after {MAX_PAGE_RETRIES} attempts")
+
+
+def backfill_shard(shard_from, shard_to):
+    """
+    Downloads one shard page by page, resuming after its last committed page.
+    Each page is inserted and checkpointed in a single transaction.
+    Returns (window_from, rows_inserted_by_this_call, metrics_record_of_this_call,
+    instrumentation_samples_of_this_call).
+    """
+    metrics = RunMetrics('cba_backfill_shard')
+    window_from = f"{shard_from.isoformat()}T00:00:00.000Z"
+    window_to = f"{shard_to.isoformat()}{DAY_END_SUFFIX}"
+
+    with pooled_connection() as conn:
+        checkpoint = load_checkpoint(conn, CHECKPOINT_JOB, window_from, window_to)
+
+    if checkpoint and checkpoint['completed']:
+        logging.info(f"[{shard_from} .. {shard_to}] Already complete. Skipping.")
+        return window_from, 0, metrics.as_record(), instrumentation.collect()
+
+    current_page = checkpoint['last_page'] + 1 if checkpoint else 1
+    total_pages = checkpoint['total_pages'] if checkpoint else None
+    rows_inserted = checkpoint['rows_inserted'] if checkpoint else 0
+    inserted_now = 0
+
+    if current_page > 1:
+        logging.info(f"[{shard_from} .. {shard_to}] Resuming from page {current_page}")
+
+    params = {
+        "date_from": window_from,
+        "date_to": window_to,
+        "per_page": RECORDS_PER_PAGE,
+        "page": current_page
+    }
+
+    while total_pages is None or current_page <= total_pages:
+        payload = fetch_page(params, current_page, metrics)
+        total_pages = math.ceil(payload.get('total_count', 0) / RECORDS_PER_PAGE)
+        rows = payload.get('rows', [])
+        if not rows:
+            break
+
+        with metrics.stage('insert'), pooled_connection() as conn:
+            count = bulk_insert('donations', DONATION_COLUMNS, prepare_rows(rows),
+                                conflict_columns=('id',), conn=conn)
+            rows_inserted += count
+            save_checkpoint(conn, CHECKPOINT_JOB, window_from, window_to, current_page,
+                            total_pages=total_pages, rows_inserted=rows_inserted)
+            conn.commit()
+
+        inserted_now += count
+        metrics.incr('rows_fetched', len(rows))
+        metrics.incr('rows_inserted', count)
+        metrics.incr('rows_skipped', len(rows) - count)
+        logging.info(f"[{shard_from} .. {shard_to}] Page {current_page}/{total_pages} | Saved: {count}")
+        current_page += 1
+
+    with pooled_connection() as conn:
+        save_checkpoint(conn, CHECKPOINT_JOB, window_from, window_to, current_page - 1,
+                        total_pages=total_pages, rows_inserted=rows_inserted, completed=True)
+        conn.commit()
+
+    logging.info(f"Finished shard {shard_from} .. {shard_to}: {rows_inserted} rows in total")
+    return window_from, inserted_now, metrics.as_record(), instrumentation.collect()
+
+
+def run_backfill(date_from, date_to, shard_size='month', workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+    """
+    Runs every shard of the range in a process pool sharing one global rate limit.
+    """
+    shards = build_shards(date_from, date_to, shard_size)
+    logging.info(f"Backfilling {date_from} .. {date_to}: {len(shards)} {shard_size} shards, "
+                 f"{workers} workers, {rate} req/s")
+
+    with pooled_connection() as conn:
+        init_checkpoints(conn)
+    # Workers open their own connections; nothing should be inherited through fork
+    close_pool()
+
+    metrics = RunMetrics('cba_backfill')
+    total_inserted = 0
+    failed_shards = 0
+
+    with multiprocessing.Manager() as manager:
+        lock = manager.Lock()
+        next_slot = manager.Value('d', 0.0)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(lock, next_slot, rate)) as executor:
+            futures = {executor.submit(backfill_shard, s, e): (s, e) for s, e in shards}
+
+            for future in as_completed(futures):
+                shard_from, shard_to = futures[future]
+                try:
+                    _, inserted, shard_record, shard_samples = future.result()
+                    total_inserted += inserted
+                    metrics.merge(shard_record)
+                    instrumentation.merge(shard_samples)
+                except Exception as e:
+                    failed_shards += 1
+                    logging.error(f"Shard {shard_from} .. {shard_to} failed: {e}. "
+                                  f"Progress is checkpointed; rerun to resume.")
+
+    logging.info(f"Backfill complete. Total new entries: {total_inserted}. Failed shards: {failed_shards}")
+
+    try:
+        with metrics.stage('post_process'):
+            apply_conversions(since=date_from.isoformat())
+            refresh_rollups(since=date_from.isoformat(), until=date_to.isoformat())
+    except Exception as e:
+        logging.error(f"Amount conversion or rollup refresh failed: {e}")
+
+    # Technical Note: Final stdout line (JSON metrics record) to be consumed by the alerting system
+    metrics.emit('partial' if failed_shards else 'ok')
+
+    if failed_shards:
+        sys.exit(1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parallel, resumable Come Back Alive backfill")
+    parser.add_argument('--from', dest='date_from', required=True, type=datetime.date.fromisoformat,
+                        help="First day to backfill (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='date_to', type=datetime.date.fromisoformat,
+                        default=datetime.date.today(), help="Last day to backfill, inclusive (YYYY-MM-DD)")
+    parser.add_argument('--shard', choices=('month', 'week'), default='month')
+    parser.add_argument('--workers', type=int, default=int(os.getenv("CBA_BACKFILL_WORKERS", DEFAULT_WORKERS)))
+    parser.add_argument('--rate', type=float, default=float(os.getenv("CBA_BACKFILL_RATE", DEFAULT_RATE)),
+                        help="Global request rate limit (requests/second)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_backfill(args.date_from, args.date_to, args.shard, args.workers, args.rate)
@@ -1,13 +1,16 @@
 import os
 import sys  # Added for proper exit codes
+import json
 import time
 import math
 import random
 import logging
+import argparse
 import datetime
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import psycopg2
 import cloudscraper
 from dotenv import load_dotenv
 
@@ -18,6 +21,19 @@ load_dotenv()
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 PG_URI = os.getenv("DATABASE_URL")
 
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from utils.pg_ingest import bulk_insert, pooled_connection
+from utils.ingest_checkpoints import (
+    init_checkpoints, find_open_checkpoint, list_open_checkpoints, load_checkpoint, save_checkpoint,
+    delete_checkpoint
+)
+from processors.currency_conversion import apply_conversions
+from processors.rollups import refresh_rollups
+from utils.run_metrics import RunMetrics
+from utils import instrumentation
+
 if not PG_URI:
     raise ValueError("DATABASE_URL not found in environment variables")
 
@@ -29,30 +45,79 @@ logging.basicConfig(
 )
 
 # Constants
-API_URL = "https://cba-transapi.savelife.in.ua/wp-json/savelife/reporting/income"
+# Overridable so benchmarks can replay recorded pages from a local stub server
+API_URL = os.getenv("CBA_API_URL", "https://cba-transapi.savelife.in.ua/wp-json/savelife/reporting/income")
 RECORDS_PER_PAGE = 100
+# Inclusive end of a window's last day; the API timestamps carry milliseconds
+DAY_END_SUFFIX = 'T23:59:59.999Z'
 FOUNDATION_NAME = 'come_back_alive'
+CHECKPOINT_JOB = 'cba_live'
+DONATION_COLUMNS = ('id', 'amount', 'currency', 'date', 'comment', 'source', 'foundation_name', 'category')
+
+# Concurrency: number of pages fetched in parallel (1 = legacy serial walk)
+FETCH_WORKERS = int(os.getenv("CBA_FETCH_WORKERS", "4"))
+RATE_LIMIT_BACKOFF = 60
+
+# Technical Note: cloudscraper sessions are not thread-safe, so every worker keeps its own
+_thread_state = threading.local()
+
+metrics = RunMetrics('extract_live_cba')
+
+
+class SharedBackoff:
+    """
+    Cross-thread pause gate. A single HTTP 429 holds every worker until the window passes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self):
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            instrumentation.count_sleep('rate_limit_429', delay)
+            time.sleep(delay)
+
+    def trigger(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+def create_scraper():
+    return cloudscraper.create_scraper(
+        browser={'browser': 'chrome', 'platform': 'windows', 'desktop': True}
+    )
+
+
+def get_thread_scraper():
+    """
+    Returns the cloudscraper session bound to the calling worker thread.
+    """
+    scraper = getattr(_thread_state, 'scraper', None)
+    if scraper is None:
+        scraper = create_scraper()
+        _thread_state.scraper = scraper
+    return scraper
 
 
 def get_latest_date_from_db():
     """
     Retrieves the most recent donation date for the foundation.
     """
-    conn = None
     try:
-        conn = psycopg2.connect(PG_URI)
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT MAX(date) FROM donations WHERE foundation_name = %s", (FOUNDATION_NAME,))
-        res = cursor.fetchone()[0]
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(date) FROM donations WHERE foundation_name = %s", (FOUNDATION_NAME,))
+            res = cursor.fetchone()[0]
 
         return str(res)[:10] if res else "2024-01-01"
     except Exception as e:
         logging.error(f"Database error during date lookup: {e}")
         return "2024-01-01"
-    finally:
-        if conn:
-            conn.close()
 
 
 def normalize_date(date_str):
@@ -65,15 +130,11 @@ def normalize_date(date_str):
         return date_str
 
 
-def save_live_records(rows):
+def prepare_rows(rows):
     """
-    Batch inserts records with conflict handling.
-    Returns the number of rows actually inserted.
+    Maps raw API rows onto the DONATION_COLUMNS tuple layout.
     """
-    conn = psycopg2.connect(PG_URI)
-    cursor = conn.cursor()
-
-    prepared_rows = [
+    return [
         (
             r['id'],
             float(r['amount']),
@@ -86,89 +147,276 @@ def save_live_records(rows):
         ) for r in rows
     ]
 
-    try:
-        cursor.executemany('''
-            INSERT INTO donations (id, amount, currency, date, comment, source, foundation_name, category)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (id) DO NOTHING
-        ''', prepared_rows)
-        conn.commit()
-        # rowcount represents number of affected rows
-        return cursor.rowcount
-    except Exception as e:
-        logging.error(f"Insert failed: {e}")
-        conn.rollback()
-        return 0
-    finally:
-        conn.close()
-
 
-def run_live_update():
+def resolve_sync_window():
     """
-    Main ingestion process.
+    Returns (date_from, date_to, checkpoint).
+    An unfinished checkpoint opened today is resumed with its original window,
+    so an Airflow retry continues after the last committed page instead of page 1.
     """
+    with pooled_connection() as conn:
+        init_checkpoints(conn)
+        checkpoint = find_open_checkpoint(conn, CHECKPOINT_JOB)
+
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    if checkpoint and checkpoint['window_to'][:10] == today:
+        return checkpoint['window_from'], checkpoint['window_to'], checkpoint
+
     last_date = get_latest_date_from_db()
     date_from = f"{last_date}T00:00:00.000Z"
     date_to = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    return date_from, date_to, None
 
-    logging.info(f"Syncing {FOUNDATION_NAME} from {date_from}")
 
-    scraper = cloudscraper.create_scraper(
-        browser={'browser': 'chrome', 'platform': 'windows', 'desktop': True}
+def load_window_checkpoint(date_from, date_to):
+    """
+    Returns the checkpoint of an explicit (planned) window, or None if it was never started.
+    """
+    with pooled_connection() as conn:
+        init_checkpoints(conn)
+        return load_checkpoint(conn, CHECKPOINT_JOB, date_from, date_to)
+
+
+def plan_sync_windows(shards):
+    """
+    Splits the pending sync range into at most `shards` day-aligned windows for parallel runs.
+    The range starts at the last stored day, or earlier if an older window is still unfinished,
+    and ends now. Every planned window is registered as an open checkpoint (and the unfinished
+    windows it replaces are deleted in the same transaction, since their range is covered again),
+    so a shard that fails or never starts is planned again by the next run instead of leaving
+    a gap behind the shards that succeeded.
+    Returns [(date_from, date_to)].
+    """
+    with pooled_connection() as conn:
+        init_checkpoints(conn)
+        unfinished = list_open_checkpoints(conn, CHECKPOINT_JOB)
+
+    first_day = datetime.date.fromisoformat(
+        min([get_latest_date_from_db()] + [c['window_from'][:10] for c in unfinished])
     )
+    now = datetime.datetime.now()
+    days = (now.date() - first_day).days + 1
+    count = max(1, min(shards, days))
+
+    windows = []
+    for index in range(count):
+        start = first_day + datetime.timedelta(days=days * index // count)
+        if index == count - 1:
+            date_to = now.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        else:
+            last = first_day + datetime.timedelta(days=days * (index + 1) // count - 1)
+            date_to = f"{last.isoformat()}{DAY_END_SUFFIX}"
+        windows.append((f"{start.isoformat()}T00:00:00.000Z", date_to))
+
+    with pooled_connection() as conn:
+        for c in unfinished:
+            delete_checkpoint(conn, CHECKPOINT_JOB, c['window_from'], c['window_to'])
+        for date_from, date_to in windows:
+            save_checkpoint(conn, CHECKPOINT_JOB, date_from, date_to, 0)
+        conn.commit()
+
+    logging.info(f"Planned {len(windows)} window(s) from {first_day} "
+                 f"({len(unfinished)} unfinished window(s) folded in)")
+    return windows
+
+
+class PageCommitter:
+    """
+    Writes fetched pages and advances the window checkpoint in one transaction.
+    Pages may complete out of order, so the checkpoint only records the highest
+    page below which every page is committed; anything above it is re-fetched on
+    resume and de-duplicated by ON CONFLICT.
+    """
+
+    def __init__(self, date_from, date_to, total_pages, committed_through=0, rows_inserted=0):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.total_pages = total_pages
+        self.committed_through = committed_through
+        self.rows_inserted = rows_inserted
+        self._done_pages = set()
+
+    def commit(self, page, rows):
+        with metrics.stage('insert'), pooled_connection() as conn:
+            count = 0
+            if rows:
+                count = bulk_insert('donations', DONATION_COLUMNS, prepare_rows(rows),
+                                    conflict_columns=('id',), conn=conn)
+
+            self._done_pages.add(page)
+            while self.committed_through + 1 in self._done_pages:
+                self.committed_through += 1
+                self._done_pages.discard(self.committed_through)
+
+            save_checkpoint(conn, CHECKPOINT_JOB, self.date_from, self.date_to, self.committed_through,
+                            total_pages=self.total_pages, rows_inserted=self.rows_inserted + count)
+            conn.commit()
+
+        self.rows_inserted += count
+        metrics.incr('rows_fetched', len(rows))
+        metrics.incr('rows_skipped', len(rows) - count)
+        return count
+
+    def complete(self):
+        with pooled_connection() as conn:
+            save_checkpoint(conn, CHECKPOINT_JOB, self.date_from, self.date_to, self.total_pages,
+                            total_pages=self.total_pages, rows_inserted=self.rows_inserted, completed=True)
+            conn.commit()
+
+
+def fetch_page(page, params, backoff):
+    """
+    Fetches a single income page, honouring the shared 429 back-off.
+    Returns the page rows; raises on any non-retryable API status.
+    """
+    scraper = get_thread_scraper()
+    page_params = dict(params, page=page)
+
+    while True:
+        backoff.wait()
+        with instrumentation.timed('http_request', target='cba_income'):
+            res = scraper.get(API_URL, params=page_params)
+        metrics.observe_response(res)
+        instrumentation.count_response('cba_income', res)
+
+        if res.status_code == 200:
+            rows = res.json().get('rows', [])
+            # Politeness jitter is applied per worker, so the aggregate rate scales with FETCH_WORKERS
+            jitter = random.uniform(0.3, 0.7)
+            instrumentation.count_sleep('politeness', jitter)
+            time.sleep(jitter)
+            return rows
+        if res.status_code == 429:
+            logging.warning(f"Rate limit hit on page {page}. Pausing all workers for {RATE_LIMIT_BACKOFF}s.")
+            backoff.trigger(RATE_LIMIT_BACKOFF)
+            continue
+
+        raise RuntimeError(f"API returned {res.status_code} on page {page}")
+
+
+def run_live_update(workers=FETCH_WORKERS, window=None, defer_post_process=False):
+    """
+    Main ingestion process.
+    Pages are fetched by a bounded thread pool; inserts stay on the main thread,
+    so every page is written exactly once. Progress is checkpointed per page.
+    `window` is a (date_from, date_to) pair from plan_sync_windows(); without it the
+    window runs from the last stored day to now. With defer_post_process=True conversion
+    and rollups are left to processors/post_ingest.py.
+    """
+    if window:
+        date_from, date_to = window
+        checkpoint = load_window_checkpoint(date_from, date_to)
+        if checkpoint and checkpoint['completed']:
+            logging.info(f"Window {date_from} .. {date_to} is already complete.")
+            metrics.emit()
+            return
+    else:
+        date_from, date_to, checkpoint = resolve_sync_window()
+    start_page = checkpoint['last_page'] + 1 if checkpoint else 1
+
+    if checkpoint and checkpoint['last_page']:
+        logging.info(f"Resuming {FOUNDATION_NAME} window {date_from} .. {date_to} from page {start_page}")
+    else:
+        logging.info(f"Syncing {FOUNDATION_NAME} from {date_from} ({workers} workers)")
+
+    scraper = get_thread_scraper()
 
     params = {
         "date_from": date_from,
         "date_to": date_to,
         "per_page": RECORDS_PER_PAGE,
-        "page": 1
+        "page": start_page
     }
 
-    # Technical Note: Initialize counter for Airflow XCom telemetry
-    total_records_added = 0
-
     try:
-        response = scraper.get(API_URL, params=params)
+        with metrics.stage('metadata'), instrumentation.timed('http_request', target='cba_income'):
+            response = scraper.get(API_URL, params=params)
+        metrics.observe_response(response)
+        instrumentation.count_response('cba_income', response)
         if response.status_code != 200:
             logging.error(f"API returned {response.status_code}")
             sys.exit(1)  # Fix: Hard exit on API error
 
-        total_count = response.json().get('total_count', 0)
+        payload = response.json()
+        total_count = payload.get('total_count', 0)
         total_pages = math.ceil(total_count / RECORDS_PER_PAGE)
         logging.info(f"Total potential records: {total_count} ({total_pages} pages)")
     except Exception as e:
         logging.error(f"Initial request failed: {e}")
         sys.exit(1)  # Fix: Hard exit on connection failure
 
-    for current_page in range(1, total_pages + 1):
-        try:
-            params["page"] = current_page
-            res = scraper.get(API_URL, params=params)
+    # Technical Note: rows committed by an earlier failed try count towards this window's XCom total
+    committer = PageCommitter(
+        date_from, date_to, total_pages,
+        committed_through=start_page - 1,
+        rows_inserted=checkpoint['rows_inserted'] if checkpoint else 0
+    )
+
+    # The metadata request already returned the first page, so it is saved instead of re-fetched
+    current_page = start_page
+    try:
+        if start_page <= total_pages:
+            count = committer.commit(start_page, payload.get('rows', []))
+            logging.info(f"Page {start_page}/{total_pages} | Inserted: {count}")
+    except Exception as e:
+        logging.error(f"Error on page {start_page}: {e}")
+        sys.exit(1)
 
-            if res.status_code == 200:
-                rows = res.json().get('rows', [])
-                if not rows:
-                    break
+    backoff = SharedBackoff()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    futures = {
+        executor.submit(fetch_page, page, params, backoff): page
+        for page in range(start_page + 1, total_pages + 1)
+    }
 
-                count = save_live_records(rows)
-                total_records_added += count
+    try:
+        with metrics.stage('fetch_pages'):
+            for future in as_completed(futures):
+                current_page = futures[future]
+                count = committer.commit(current_page, future.result())
                 logging.info(f"Page {current_page}/{total_pages} | Inserted: {count}")
-                time.sleep(random.uniform(0.3, 0.7))
-            elif res.status_code == 429:
-                logging.warning("Rate limit hit. Waiting 60s.")
-                time.sleep(60)
-            else:
-                logging.error(f"API returned {res.status_code} on page {current_page}")
-                sys.exit(1)  # Fix: Hard exit on pagination API error
+    except Exception as e:
+        logging.error(f"Error on page {current_page}: {e}. "
+                      f"Checkpoint kept at page {committer.committed_through}.")
+        executor.shutdown(wait=False, cancel_futures=True)
+        sys.exit(1)  # Fix: Hard exit on exception during pagination
+
+    executor.shutdown()
+    committer.complete()
+
+    if committer.rows_inserted:
+        metrics.note_changed_since(date_from[:10])
+
+    if defer_post_process:
+        logging.info(f"Conversion and rollups from {date_from[:10]} deferred to the post-ingest task")
+    else:
+        try:
+            with metrics.stage('post_process'):
+                apply_conversions(since=date_from[:10])
+                refresh_rollups(since=date_from[:10])
         except Exception as e:
-            logging.error(f"Error on page {current_page}: {e}")
-            sys.exit(1)  # Fix: Hard exit on exception during pagination
+            logging.error(f"Amount conversion or rollup refresh failed: {e}")
 
+    total_records_added = committer.rows_inserted
     logging.info(f"Update complete. Total new entries: {total_records_added}")
 
-    # Technical Note: Final stdout line to be consumed by the alerting system
-    print(total_records_added)
+    # Technical Note: Final stdout line (JSON metrics record) to be consumed by the alerting system
+    metrics.incr('rows_inserted', total_records_added)
+    metrics.emit()
 
 
 if __name__ == "__main__":
-    run_live_update()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Come Back Alive live sync")
+    parser.add_argument('--plan-shards', type=int, metavar='N',
+                        help="Only plan up to N sync windows and print them as a JSON list")
+    parser.add_argument('--window', nargs=2, metavar=('FROM', 'TO'),
+                        help="Sync one planned window (ISO timestamps, as printed by --plan-shards)")
+    parser.add_argument('--defer-post-process', action='store_true',
+                        help="Skip conversion and rollups; processors/post_ingest.py runs them later")
+    args = parser.parse_args()
+
+    if args.plan_shards:
+        # Technical Note: Final stdout line (JSON list of windows) is the XCom the DAG maps over
+        print(json.dumps(plan_sync_windows(args.plan_shards)), flush=True)
+    else:
+        run_live_update(window=args.window, defer_post_process=args.defer_post_process)
\ No newline at end of file
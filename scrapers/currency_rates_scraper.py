@@ -1,10 +1,11 @@
 import os
+import sys
 import requests
 import logging
-import random
-import time
+import argparse
 from datetime import datetime, timedelta, date
-import psycopg2
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 # Logger setup
@@ -23,131 +24,252 @@ PG_URI = os.getenv("DATABASE_URL")
 if not PG_URI:
     raise ValueError("DATABASE_URL not found in environment variables. Please check your .env file.")
 
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from utils.pg_ingest import bulk_insert, pooled_connection
+from processors.currency_conversion import apply_conversions
+from processors.rollups import refresh_rollups
+from utils.run_metrics import RunMetrics
+from utils import instrumentation
+
+# NBU endpoints: the range endpoint serves one currency over a date interval per request,
+# the daily endpoint serves every currency for a single date (used as fallback).
+# Both are overridable so benchmarks can point them at a local stub server.
+NBU_RANGE_URL = os.getenv("NBU_RANGE_URL", "https://bank.gov.ua/NBU_Exchange/exchange_site")
+NBU_DAILY_URL = os.getenv("NBU_DAILY_URL", "https://bank.gov.ua/NBUStatService/v1/statdirectory/exchange")
+
+CURRENCIES = [
+    c.strip().upper() for c in os.getenv("NBU_CURRENCIES", "EUR,USD,GBP,PLN,CHF,CAD").split(',') if c.strip()
+]
+DEFAULT_START_DATE = datetime(2024, 1, 1)
+RANGE_CHUNK_DAYS = 366
+FETCH_WORKERS = 4
+
+metrics = RunMetrics('extract_exchange_rates')
+
 
 def init_db():
     """
     Ensures the target table exists in PostgreSQL with proper constraints.
+    Legacy tables keyed on `date` alone (EUR only) are migrated to (date, currency).
     """
-    conn = psycopg2.connect(PG_URI)
-    try:
+    with pooled_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS exchange_rates (
-                date DATE PRIMARY KEY,
-                currency TEXT,
-                rate_uah REAL
+                date DATE NOT NULL,
+                currency TEXT NOT NULL,
+                rate_uah REAL,
+                PRIMARY KEY (date, currency)
             )
         ''')
+
+        cursor.execute('''
+            SELECT conname, array_length(conkey, 1)
+            FROM pg_constraint
+            WHERE conrelid = 'exchange_rates'::regclass AND contype = 'p'
+        ''')
+        pk = cursor.fetchone()
+        if pk and pk[1] == 1:
+            logger.info("Migrating exchange_rates primary key from (date) to (date, currency)...")
+            cursor.execute("UPDATE exchange_rates SET currency = 'EUR' WHERE currency IS NULL")
+            cursor.execute(f'ALTER TABLE exchange_rates DROP CONSTRAINT "{pk[0]}"')
+            cursor.execute("ALTER TABLE exchange_rates ALTER COLUMN currency SET NOT NULL")
+            cursor.execute("ALTER TABLE exchange_rates ADD PRIMARY KEY (date, currency)")
+
         conn.commit()
-    finally:
-        conn.close()
 
 
-def get_latest_date():
+def get_latest_dates():
     """
-    Retrieves the maximum date from the exchange_rates table.
-    Used for incremental loading.
+    Retrieves the maximum stored date per currency.
+    Used for incremental loading; currencies without history are absent.
     """
-    conn = None
     try:
-        conn = psycopg2.connect(PG_URI)
-        cursor = conn.cursor()
-
-        # Check if the table exists first
-        cursor.execute("SELECT to_regclass('public.exchange_rates');")
-        if not cursor.fetchone()[0]:
-            return None
-
-        cursor.execute("SELECT MAX(date) FROM exchange_rates WHERE currency = 'EUR'")
-        res = cursor.fetchone()[0]
-
-        if not res:
-            return None
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT currency, MAX(date) FROM exchange_rates GROUP BY currency")
+            rows = cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Failed to check metadata: {e}")
+        return {}
 
+    latest = {}
+    for currency, res in rows:
         # Handle Postgres date/datetime returns
         if isinstance(res, datetime):
-            return res
+            latest[currency] = res
         elif isinstance(res, date):
-            return datetime.combine(res, datetime.min.time())
+            latest[currency] = datetime.combine(res, datetime.min.time())
+        elif res:
+            latest[currency] = datetime.strptime(str(res).split(' ')[0], '%Y-%m-%d')
+    return latest
 
-        return datetime.strptime(str(res).split(' ')[0], '%Y-%m-%d')
 
-    except Exception as e:
-        logger.error(f"Failed to check metadata: {e}")
-        return None
-    finally:
-        if conn:
-            conn.close()
+def parse_nbu_record(item):
+    """
+    Converts one NBU JSON record into a (date_iso, currency, rate_uah_per_unit) tuple.
+    """
+    day = datetime.strptime(item['exchangedate'], '%d.%m.%Y').strftime('%Y-%m-%d')
+    rate = item.get('rate_per_unit')
+    if rate is None:
+        rate = float(item['rate']) / float(item.get('units') or 1)
+    return day, item['cc'].upper(), float(rate)
 
 
-def sync_exchange_rates():
+def fetch_rate_range(currency, start, end):
+    """
+    One request for a whole [start, end] interval of a single currency.
     """
-    Fetches missing EUR rates from NBU API and saves them to the PostgreSQL DB.
+    params = {
+        'start': start.strftime('%Y%m%d'),
+        'end': end.strftime('%Y%m%d'),
+        'valcode': currency.lower(),
+        'sort': 'exchangedate',
+        'order': 'asc'
+    }
+    with instrumentation.timed('http_request', target='nbu_range'):
+        res = requests.get(f"{NBU_RANGE_URL}?json", params=params, timeout=30)
+    metrics.observe_response(res)
+    instrumentation.count_response('nbu_range', res)
+    res.raise_for_status()
+    return [parse_nbu_record(item) for item in res.json()]
+
+
+def fetch_rates_for_day(day):
+    """
+    Fallback: every currency published for a single date, in one request.
+    """
+    with instrumentation.timed('http_request', target='nbu_daily'):
+        res = requests.get(f"{NBU_DAILY_URL}?json", params={'date': day.strftime('%Y%m%d')}, timeout=10)
+    metrics.observe_response(res)
+    instrumentation.count_response('nbu_daily', res)
+    res.raise_for_status()
+    return [parse_nbu_record(item) for item in res.json()]
+
+
+def split_range(start, end, chunk_days=RANGE_CHUNK_DAYS):
+    chunks = []
+    while start.date() <= end.date():
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end + timedelta(days=1)
+    return chunks
+
+
+def sync_exchange_rates(defer_post_process=False):
+    """
+    Fetches missing rates for every configured currency from the NBU API
+    and saves them to the PostgreSQL DB with a single bulk UPSERT.
+    With defer_post_process=True conversion and rollups are left to processors/post_ingest.py.
     """
     logger.info("Initializing Database...")
     init_db()
 
-    last_date = get_latest_date()
-    # If no data, start from the beginning of 2024
-    start_date = (last_date + timedelta(days=1)) if last_date else datetime(2024, 1, 1)
+    latest = get_latest_dates()
     end_date = datetime.now()
 
-    # Compare only dates to avoid time-of-day execution bugs
-    if start_date.date() > end_date.date():
+    # Each currency resumes from its own last date, so newly added codes backfill from the default start
+    requests_plan = []
+    for currency in CURRENCIES:
+        last_date = latest.get(currency)
+        start_date = (last_date + timedelta(days=1)) if last_date else DEFAULT_START_DATE
+        # Compare only dates to avoid time-of-day execution bugs
+        if start_date.date() <= end_date.date():
+            requests_plan.extend((currency, s, e) for s, e in split_range(start_date, end_date))
+
+    if not requests_plan:
         logger.info("Exchange rates are already up to date.")
-        # Technical Note: Print 0 as the last stdout line for Airflow XCom telemetry
-        print(0)
+        # Technical Note: Emit the (empty) metrics record as the last stdout line for Airflow XCom telemetry
+        metrics.emit()
         return
 
-    conn = psycopg2.connect(PG_URI)
-    cursor = conn.cursor()
-
-    current_date = start_date
-    records_added = 0
-
-    try:
-        while current_date.date() <= end_date.date():
-            date_api = current_date.strftime('%Y%m%d')
-            url = f"https://bank.gov.ua/NBUStatService/v1/statdirectory/exchange?valcode=EUR&date={date_api}&json"
+    logger.info(f"Requesting {len(requests_plan)} range(s) for {', '.join(CURRENCIES)}")
 
+    rate_rows = []
+    failed = []
+    with metrics.stage('fetch'), ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        futures = {executor.submit(fetch_rate_range, *task): task for task in requests_plan}
+        for future in as_completed(futures):
+            currency, start, end = futures[future]
             try:
-                res = requests.get(url, timeout=10)
-                res.raise_for_status()
-                data = res.json()
-
-                if data:
-                    rate = data[0]['rate']
-                    day_iso = current_date.strftime('%Y-%m-%d')
-
-                    # PostgreSQL equivalent for UPSERT
-                    cursor.execute('''
-                        INSERT INTO exchange_rates (date, currency, rate_uah)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (date) DO UPDATE 
-                        SET rate_uah = EXCLUDED.rate_uah
-                    ''', (day_iso, 'EUR', rate))
-
-                    logger.info(f"Fetched: {day_iso} | EUR: {rate}")
-                    records_added += 1
+                rows = future.result()
+                rate_rows.extend(rows)
+                logger.info(f"Fetched: {currency} {start:%Y-%m-%d} .. {end:%Y-%m-%d} | {len(rows)} rates")
             except Exception as e:
-                logger.error(f"API Error at {date_api}: {e}")
-                break  # Commit what we have and stop
+                logger.error(f"Range API Error for {currency} {start:%Y-%m-%d} .. {end:%Y-%m-%d}: {e}")
+                failed.append(futures[future])
 
-            current_date += timedelta(days=1)
-            time.sleep(random.uniform(0.1, 0.2))
+    # Currency -> first day whose rate could not be fetched by either endpoint
+    first_gap = {}
+    if failed:
+        # Fallback: the daily endpoint returns all currencies at once, so each date is requested only once
+        wanted = {}
+        for currency, start, end in failed:
+            for s, _ in split_range(start, end, chunk_days=1):
+                wanted.setdefault(s.date(), set()).add(currency)
 
-        conn.commit()
-        logger.info(f"Synchronization complete. Records added/updated: {records_added}")
+        logger.warning(f"Falling back to per-day requests for {len(wanted)} dates...")
+        with metrics.stage('fetch_daily_fallback'), ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+            futures = {executor.submit(fetch_rates_for_day, day): day for day in wanted}
+            for future in as_completed(futures):
+                day = futures[future]
+                try:
+                    rate_rows.extend(r for r in future.result() if r[1] in wanted[day])
+                except Exception as e:
+                    logger.error(f"API Error at {day:%Y%m%d}: {e}")
+                    for currency in wanted[day]:
+                        first_gap[currency] = min(first_gap.get(currency, day), day)
 
+    metrics.incr('rows_fetched', len(rate_rows))
+    status = 'ok'
+    if first_gap:
+        # Each currency resumes from MAX(date) + 1, so rates stored past a missing day would
+        # hide it forever. Only rates before the first gap are kept; the next run starts there.
+        kept = [r for r in rate_rows if r[1] not in first_gap or r[0] < first_gap[r[1]].isoformat()]
+        for currency, day in sorted(first_gap.items()):
+            logger.warning(f"{currency}: no rate for {day:%Y-%m-%d}; later rates are held back until it is fetched")
+        metrics.incr('rows_skipped', len(rate_rows) - len(kept))
+        rate_rows = kept
+        status = 'partial'
+
+    records_added = 0
+    try:
+        # Single bulk UPSERT of every (date, currency) pair for the whole run
+        with metrics.stage('insert'):
+            records_added = bulk_insert(
+                'exchange_rates', ('date', 'currency', 'rate_uah'), rate_rows,
+                conflict_columns=('date', 'currency'), update_columns=('rate_uah',)
+            )
+        logger.info(f"Synchronization complete. Records added/updated: {records_added}")
     except Exception as e:
         logger.error(f"Sync failed: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        status = 'failed'
+
+    if records_added:
+        # Late rates change the forward-filled series from their date onwards
+        since = min(r[0] for r in rate_rows)
+        metrics.note_changed_since(since)
+        if defer_post_process:
+            logger.info(f"Conversion and rollups from {since} deferred to the post-ingest task")
+        else:
+            try:
+                with metrics.stage('post_process'):
+                    apply_conversions(since=since)
+                    refresh_rollups(since=since)
+            except Exception as e:
+                logger.error(f"Amount conversion or rollup refresh failed: {e}")
 
-    # Technical Note: Final stdout output consumed by the downstream alerting bot
-    print(records_added)
+    # Technical Note: Final stdout output (JSON metrics record) consumed by the downstream alerting bot
+    metrics.incr('rows_inserted', records_added)
+    metrics.incr('rows_skipped', len(rate_rows) - records_added if status != 'failed' else 0)
+    metrics.emit(status)
 
 
 if __name__ == "__main__":
-    sync_exchange_rates()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="NBU exchange rate sync")
+    parser.add_argument('--defer-post-process', action='store_true',
+                        help="Skip conversion and rollups; processors/post_ingest.py runs them later")
+    sync_exchange_rates(defer_post_process=parser.parse_args().defer_post_process)
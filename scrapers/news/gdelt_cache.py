@@ -0,0 +1,184 @@
+import os
+import logging
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from utils import instrumentation
+
+# Local day-partitioned Parquet cache of GDELT GKG results: data/cache/gdelt/event_date=YYYY-MM-DD/.
+# Only days missing from the cache are sent to the query backend. Days that GDELT may still
+# be publishing (today and yesterday, UTC) are never treated as final and are re-queried.
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+CACHE_DIR = Path(os.getenv("GDELT_CACHE_DIR", BASE_DIR / 'data' / 'cache' / 'gdelt'))
+RESULT_COLUMNS = ['event_date', 'source', 'url']
+FINAL_AFTER_DAYS = 2
+
+logger = logging.getLogger(__name__)
+
+
+class BigQueryBackend:
+    """
+    Runs the GKG query against gdelt-bq.gdeltv2.gkg_partitioned for an inclusive day range.
+    """
+
+    QUERY = """
+    SELECT
+      FORMAT_TIMESTAMP('%Y-%m-%d', PARSE_TIMESTAMP('%Y%m%d%H%M%S', CAST(date AS STRING))) AS event_date,
+      LOWER(SourceCommonName) AS source,
+      DocumentIdentifier AS url
+    FROM `gdelt-bq.gdeltv2.gkg_partitioned`
+    WHERE
+      _PARTITIONTIME >= TIMESTAMP(@date_from)
+      AND _PARTITIONTIME < TIMESTAMP(@partition_to)
+      AND FORMAT_TIMESTAMP('%Y-%m-%d', PARSE_TIMESTAMP('%Y%m%d%H%M%S', CAST(date AS STRING)))
+          BETWEEN @date_from AND @date_to
+      AND (V2Themes LIKE '%UKRAINE%' OR V2Themes LIKE '%UKR%')
+      AND (V2Themes LIKE '%WAR%' OR V2Themes LIKE '%CONFLICT%' OR V2Themes LIKE '%MILITARY%')
+      AND LOWER(SourceCommonName) IN ('theguardian.com', 'kyivindependent.com')
+      AND TranslationInfo IS NULL
+    """
+
+    def __init__(self, client=None):
+        # Imported lazily so offline runs do not need the Google client libraries
+        from google.cloud import bigquery
+
+        self._bigquery = bigquery
+        self._client = client or bigquery.Client()
+
+    def fetch(self, date_from, date_to):
+        # The partition bound only limits scanned bytes; the article date decides what is returned.
+        # Articles of date_to may land in the partitions of the following days, up to the point
+        # where the cache treats a day as final, so those partitions are scanned too.
+        partition_to = date_to + timedelta(days=FINAL_AFTER_DAYS + 1)
+
+        # Query BigQuery using parameters for safety against SQL injection
+        job_config = self._bigquery.QueryJobConfig(
+            query_parameters=[
+                self._bigquery.ScalarQueryParameter("date_from", "STRING", date_from.isoformat()),
+                self._bigquery.ScalarQueryParameter("date_to", "STRING", date_to.isoformat()),
+                self._bigquery.ScalarQueryParameter("partition_to", "STRING", partition_to.isoformat()),
+            ]
+        )
+        logger.info(f"Querying BigQuery for {date_from} .. {date_to}...")
+        return self._client.query(self.QUERY, job_config=job_config).to_dataframe()
+
+
+class LocalFixtureBackend:
+    """
+    Serves (event_date, source, url) rows from a local CSV or Parquet file, for offline runs and tests.
+    """
+
+    def __init__(self, path):
+        path = Path(path)
+        frame = pd.read_parquet(path) if path.suffix == '.parquet' else pd.read_csv(path)
+        frame['event_date'] = pd.to_datetime(frame['event_date']).dt.strftime('%Y-%m-%d')
+        self._frame = frame[RESULT_COLUMNS]
+
+    def fetch(self, date_from, date_to):
+        mask = self._frame['event_date'].between(date_from.isoformat(), date_to.isoformat())
+        return self._frame[mask].copy()
+
+
+def get_default_backend():
+    """
+    GDELT_FIXTURE=<csv|parquet> switches the pipeline to an offline fixture.
+    """
+    fixture = os.getenv("GDELT_FIXTURE")
+    if fixture:
+        logger.info(f"Using local GDELT fixture: {fixture}")
+        return LocalFixtureBackend(fixture)
+    return BigQueryBackend()
+
+
+class GdeltDayCache:
+    """
+    Day-partitioned Parquet cache in front of a query backend.
+    """
+
+    def __init__(self, backend, cache_dir=CACHE_DIR):
+        self.backend = backend
+        self.cache_dir = Path(cache_dir)
+
+    def partition_path(self, day):
+        return self.cache_dir / f"event_date={day.isoformat()}" / "part-0.parquet"
+
+    def is_cached(self, day):
+        """A day is served from cache only once it is final and its partition exists."""
+        today = datetime.now(timezone.utc).date()
+        return day <= today - timedelta(days=FINAL_AFTER_DAYS) and self.partition_path(day).exists()
+
+    def missing_ranges(self, date_from, date_to):
+        """
+        Groups days that are not cached into contiguous ranges,
+        so each gap costs one backend query.
+        """
+        ranges = []
+        day = date_from
+        while day <= date_to:
+            if not self.is_cached(day):
+                if ranges and ranges[-1][1] == day - timedelta(days=1):
+                    ranges[-1] = (ranges[-1][0], day)
+                else:
+                    ranges.append((day, day))
+            day += timedelta(days=1)
+        return ranges
+
+    def _write_day(self, day, frame):
+        path = self.partition_path(day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        frame[RESULT_COLUMNS].reset_index(drop=True).astype(str).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def refresh(self, date_from, date_to):
+        """
+        Queries the backend for missing days only and stores one partition per day,
+        including empty days, so they are not queried again.
+        Returns the number of backend queries issued.
+        """
+        ranges = self.missing_ranges(date_from, date_to)
+        for start, end in ranges:
+            with instrumentation.timed('gdelt_query', backend=type(self.backend).__name__):
+                frame = self.backend.fetch(start, end)
+            frame = frame if not frame.empty else pd.DataFrame(columns=RESULT_COLUMNS)
+
+            by_day = dict(tuple(frame.groupby('event_date'))) if not frame.empty else {}
+            day = start
+            while day <= end:
+                self._write_day(day, by_day.get(day.isoformat(), pd.DataFrame(columns=RESULT_COLUMNS)))
+                day += timedelta(days=1)
+
+        cached_days = (date_to - date_from).days + 1 - sum((e - s).days + 1 for s, e in ranges)
+        instrumentation.count('gdelt_cached_days', cached_days)
+        logger.info(f"GDELT cache: {cached_days} days from cache, {len(ranges)} backend queries")
+        return len(ranges)
+
+    def load(self, date_from, date_to):
+        """
+        Returns every cached (event_date, source, url) row in the inclusive range, newest first.
+        """
+        if date_from > date_to:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+
+        self.refresh(date_from, date_to)
+
+        frames = []
+        day = date_from
+        while day <= date_to:
+            frames.append(pd.read_parquet(self.partition_path(day)))
+            day += timedelta(days=1)
+
+        result = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=RESULT_COLUMNS)
+        return result.sort_values('event_date', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def parse_day(value):
+    """Accepts 'YYYY-MM-DD' strings as well as date/datetime values."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
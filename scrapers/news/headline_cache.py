@@ -0,0 +1,85 @@
+import os
+import logging
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from utils.pg_ingest import bulk_insert
+
+# Persistent URL-keyed headline cache for the news pipeline (table news_headline_cache).
+# Resolved headlines are kept forever; failures are negative entries that expire after
+# HEADLINE_NEGATIVE_TTL_HOURS, so broken URLs are retried later but not on every rerun.
+
+NEGATIVE_TTL_HOURS = int(os.getenv("HEADLINE_NEGATIVE_TTL_HOURS", "24"))
+logger = logging.getLogger(__name__)
+
+# Query parameters that never change the article a URL points to
+TRACKING_PARAMS = {'fbclid', 'gclid', 'cmp', 'ref', 'ito'}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """
+    Canonical cache key: lower-case scheme and host, no default port, no fragment,
+    no tracking parameters, sorted query and no trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith('utm_') and k.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def init_cache(conn):
+    """
+    Ensures the cache table exists. Commits on the given connection.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS news_headline_cache (
+            url TEXT PRIMARY KEY,
+            headline TEXT,
+            status TEXT NOT NULL,
+            fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    ''')
+    conn.commit()
+
+
+def lookup_cached(conn, normalized_urls):
+    """
+    Returns {normalized_url: (headline, status)} for entries that are still valid:
+    every resolved headline plus failures younger than the negative TTL.
+    """
+    if not normalized_urls:
+        return {}
+
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT url, headline, status
+        FROM news_headline_cache
+        WHERE url = ANY(%s)
+          AND (status = 'ok' OR fetched_at > NOW() - make_interval(hours => %s))
+    ''', (list(normalized_urls), NEGATIVE_TTL_HOURS))
+    return {url: (headline, status) for url, headline, status in cursor.fetchall()}
+
+
+def store_results(results):
+    """
+    Upserts {normalized_url: (headline, status)} through the shared bulk writer.
+    Returns the number of cache rows written.
+    """
+    fetched_at = datetime.now(timezone.utc)
+    rows = [(url, headline, status, fetched_at) for url, (headline, status) in results.items()]
+    written = bulk_insert(
+        'news_headline_cache', ('url', 'headline', 'status', 'fetched_at'), rows,
+        conflict_columns=('url',), update_columns=('headline', 'status', 'fetched_at')
+    )
+    logger.info(f"Headline cache: stored {written} entries")
+    return written
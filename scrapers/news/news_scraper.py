@@ -2,14 +2,18 @@ import os
 import sys
 import time
 import json
+import random
 import logging
+import threading
 import pandas as pd
 from bs4 import BeautifulSoup
 import cloudscraper
 from sqlalchemy import create_engine, text
-from google.cloud import bigquery
 from dotenv import load_dotenv
 from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configure logging to output to stderr to prevent interference with Airflow XCom stdout captures
 logging.basicConfig(
@@ -24,10 +28,30 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 ENV_PATH = BASE_DIR / '.env'
 load_dotenv(dotenv_path=ENV_PATH)
 
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from utils.pg_ingest import bulk_insert, pooled_connection
+from scrapers.news.headline_cache import normalize_url, init_cache, lookup_cached, store_results
+from scrapers.news.gdelt_cache import GdeltDayCache, get_default_backend, parse_day
+from utils.run_metrics import RunMetrics
+from utils import instrumentation
+
 # Dynamic BigQuery credentials path
 bq_key_path = BASE_DIR / 'keys' / 'bq_key.json'
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(bq_key_path)
 
+# Headline extraction concurrency
+HEADLINE_WORKERS = int(os.getenv("HEADLINE_WORKERS", "16"))
+HEADLINE_PER_DOMAIN = int(os.getenv("HEADLINE_PER_DOMAIN", "4"))
+HEADLINE_TIMEOUT = 15
+HEADLINE_RETRIES = 3
+
+# Technical Note: cloudscraper sessions are not thread-safe, so every worker keeps its own
+_thread_state = threading.local()
+
+metrics = RunMetrics('extract_news_context')
+
 
 def get_db_engine():
     """Initialize and return the SQLAlchemy engine."""
@@ -56,99 +80,161 @@ def get_latest_news_date(engine):
         raise
 
 
-def fetch_article_headline(url, scraper):
-    """Scrape headline using cloudscraper. Returns None on failure."""
-    try:
-        response = scraper.get(url, timeout=15)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+def create_scraper():
+    return cloudscraper.create_scraper(
+        browser={'browser': 'chrome', 'platform': 'windows', 'desktop': True}
+    )
 
-        og_title = soup.find("meta", property="og:title")
-        if og_title and og_title.get("content"):
-            return og_title["content"].strip()
 
-        h1_tag = soup.find("h1")
-        if h1_tag:
-            return h1_tag.get_text(strip=True)
+def get_thread_scraper():
+    """Return the cloudscraper session bound to the calling worker thread."""
+    scraper = getattr(_thread_state, 'scraper', None)
+    if scraper is None:
+        scraper = create_scraper()
+        _thread_state.scraper = scraper
+    return scraper
 
-        if soup.title:
-            return soup.title.get_text(strip=True)
 
-        return None
-    except Exception as e:
-        logger.error(f"Request failed for {url}: {e}")
-        return None
+def extract_headline(html):
+    """Pick the headline from page HTML: og:title, then <h1>, then <title>."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    og_title = soup.find("meta", property="og:title")
+    if og_title and og_title.get("content"):
+        return og_title["content"].strip()
+
+    h1_tag = soup.find("h1")
+    if h1_tag:
+        return h1_tag.get_text(strip=True)
+
+    if soup.title:
+        return soup.title.get_text(strip=True)
+
+    return None
+
+
+def fetch_headline_with_retry(url, domain_limits):
+    """
+    Fetch one headline under its domain's concurrency limit.
+    Transient failures are retried with jittered exponential back-off; 4xx answers are final.
+    Returns (headline, status) where status is 'ok', 'no_headline', 'http_<code>' or 'error'.
+    """
+    domain = urlparse(url).netloc.lower()
+    scraper = get_thread_scraper()
+
+    with domain_limits[domain]:
+        for attempt in range(1, HEADLINE_RETRIES + 1):
+            try:
+                with instrumentation.timed('http_request', target='headline'):
+                    response = scraper.get(url, timeout=HEADLINE_TIMEOUT)
+                metrics.observe_response(response)
+                instrumentation.count_response('headline', response)
+                if 400 <= response.status_code < 500 and response.status_code != 429:
+                    return None, f"http_{response.status_code}"
+                response.raise_for_status()
+
+                with instrumentation.timed('html_parse'):
+                    headline = extract_headline(response.text)
+                return headline, 'ok' if headline else 'no_headline'
+            except Exception as e:
+                if attempt == HEADLINE_RETRIES:
+                    logger.error(f"Request failed for {url} after {attempt} attempts: {e}")
+                    return None, 'error'
+                delay = random.uniform(0.5, 1.5) * 2 ** (attempt - 1)
+                instrumentation.count_sleep('retry', delay)
+                time.sleep(delay)
+
+
+def fetch_headlines(urls):
+    """
+    Resolve headlines for many URLs with a thread pool.
+    At most HEADLINE_PER_DOMAIN requests hit the same domain at once.
+    Returns {url: (headline, status)} and logs throughput in URLs per second.
+    """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+
+    domain_limits = {
+        domain: threading.BoundedSemaphore(HEADLINE_PER_DOMAIN)
+        for domain in {urlparse(u).netloc.lower() for u in urls}
+    }
+
+    results = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=HEADLINE_WORKERS) as executor:
+        futures = {executor.submit(fetch_headline_with_retry, url, domain_limits): url for url in urls}
+        for idx, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if idx % 100 == 0:
+                logger.info(f"Processed {idx}/{len(urls)} URLs...")
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    resolved = sum(1 for headline, _ in results.values() if headline)
+    logger.info(f"Headlines: {resolved}/{len(urls)} resolved in {elapsed:.1f}s "
+                f"({len(urls) / elapsed:.1f} URLs/s, {len(domain_limits)} domains)")
+    return results
 
 
 def run_automated_pipeline():
     engine = get_db_engine()
     last_date = get_latest_news_date(engine)
-    logger.info(f"Latest news date: {last_date}. Fetching from BigQuery...")
+    date_from = parse_day(last_date) + timedelta(days=1)
+    date_to = datetime.now(timezone.utc).date()
+    logger.info(f"Latest news date: {last_date}. Loading GDELT results for {date_from} .. {date_to}...")
 
     try:
-        bq_client = bigquery.Client()
+        backend = get_default_backend()
     except Exception as e:
         logger.error("BigQuery auth failed.")
         raise e
 
-    # Query BigQuery using parameters for safety against SQL injection
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("last_date", "STRING", last_date),
-        ]
-    )
-
-    query = """
-    SELECT
-      FORMAT_TIMESTAMP('%Y-%m-%d', PARSE_TIMESTAMP('%Y%m%d%H%M%S', CAST(date AS STRING))) AS event_date,
-      LOWER(SourceCommonName) AS source,
-      DocumentIdentifier AS url
-    FROM `gdelt-bq.gdeltv2.gkg_partitioned`
-    WHERE
-      _PARTITIONTIME >= TIMESTAMP(@last_date)
-      AND FORMAT_TIMESTAMP('%Y-%m-%d', PARSE_TIMESTAMP('%Y%m%d%H%M%S', CAST(date AS STRING))) > @last_date
-      AND (V2Themes LIKE '%UKRAINE%' OR V2Themes LIKE '%UKR%')
-      AND (V2Themes LIKE '%WAR%' OR V2Themes LIKE '%CONFLICT%' OR V2Themes LIKE '%MILITARY%')
-      AND LOWER(SourceCommonName) IN ('theguardian.com', 'kyivindependent.com')
-      AND TranslationInfo IS NULL
-    ORDER BY event_date DESC
-    """
-
-    logger.info("Executing query...")
-    df = bq_client.query(query, job_config=job_config).to_dataframe()
+    # Finished days come from the local Parquet cache; only missing days are queried
+    with metrics.stage('gdelt'):
+        df = GdeltDayCache(backend).load(date_from, date_to)
+    metrics.incr('rows_fetched', len(df))
 
     if df.empty:
         logger.info("No new articles found. Exiting.")
-        print(0, flush=True)
+        metrics.emit()
         return
 
-    # Drop duplicate URLs
-    news = df.drop_duplicates(subset=['url']).copy()
+    # Drop duplicate URLs (compared in normalized form, which is also the cache key)
+    df['url_key'] = df['url'].map(normalize_url)
+    news = df.drop_duplicates(subset=['url_key']).copy()
+    metrics.incr('rows_skipped', len(df) - len(news))
     logger.info(f"Found {len(news)} new articles.")
 
-    # Scraper setup
-    scraper = cloudscraper.create_scraper(
-        browser={'browser': 'chrome', 'platform': 'windows', 'desktop': True}
-    )
+    with metrics.stage('headline_cache'), pooled_connection() as conn:
+        init_cache(conn)
+        resolved = lookup_cached(conn, news['url_key'].tolist())
+    metrics.incr('headline_cache_hits', len(resolved))
 
-    logger.info("Extracting headlines...")
-    headlines = []
-    for idx, url in enumerate(news['url']):
-        if idx % 10 == 0 and idx > 0:
-            logger.info(f"Processed {idx}/{len(news)} URLs...")
-        headlines.append(fetch_article_headline(url, scraper))
-        time.sleep(0.5)
+    pending = news[~news['url_key'].isin(resolved.keys())]
+    logger.info(f"Headline cache: {len(resolved)} hits, {len(pending)} URLs to fetch.")
 
-    news['headers'] = headlines
+    if not pending.empty:
+        logger.info("Extracting headlines...")
+        with metrics.stage('headlines'):
+            fetched = fetch_headlines(pending['url'])
+        fetched_by_key = {key: fetched[url] for key, url in zip(pending['url_key'], pending['url'])}
+        try:
+            store_results(fetched_by_key)
+        except Exception as e:
+            logger.error(f"Headline cache update failed: {e}")
+        resolved.update(fetched_by_key)
+
+    news['headers'] = news['url_key'].map(lambda key: resolved[key][0])
 
     # Error cleanup: Drop rows where headline is None
     initial_count = len(news)
     news = news.dropna(subset=['headers'])
     logger.info(f"Removed {initial_count - len(news)} rows due to request errors or missing headers.")
+    metrics.incr('rows_skipped', initial_count - len(news))
 
     if news.empty:
         logger.warning("No valid headlines. Exiting.")
-        print(0, flush=True)
+        metrics.emit()
         return
 
     # Data aggregation
@@ -160,23 +246,16 @@ def run_automated_pipeline():
     news_export['headers'] = news_export['headers'].apply(json.dumps)
 
     # Database export
-    logger.info("Pushing to PostgreSQL via direct SQLAlchemy execution...")
+    logger.info("Pushing to PostgreSQL via the shared COPY bulk writer...")
     try:
-        with engine.begin() as conn:
-            # Convert DataFrame to a list of dictionaries for bulk insert
-            records = news_export.to_dict(orient='records')
-
-            if records:
-                insert_stmt = text(
-                    "INSERT INTO news (date, source, headers) VALUES (:date, :source, :headers)"
-                )
-                conn.execute(insert_stmt, records)
-
-        rows_added = len(news_export)
+        records = news_export[['date', 'source', 'headers']].itertuples(index=False, name=None)
+        with metrics.stage('insert'):
+            rows_added = bulk_insert('news', ('date', 'source', 'headers'), records)
         logger.info(f"SUCCESS: {rows_added} rows added.")
 
-        # Print value for Airflow XCom with forced flush
-        print(rows_added, flush=True)
+        # JSON metrics record for Airflow XCom (printed with forced flush)
+        metrics.incr('rows_inserted', rows_added)
+        metrics.emit()
 
     except Exception as e:
         logger.error(f"Database export failed: {e}")
@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+from utils.pg_ingest import bulk_insert
+
+# Per-URL cache of downloaded United24 reports (table u24_report_cache).
+# ETag / Last-Modified drive conditional requests, the SHA-256 of the body decides whether
+# a re-downloaded report needs parsing at all, and raw PDFs are kept under data/raw/united24
+# so they can be re-parsed without network access. The discovered link set is kept in a
+# small JSON file, so a failed discovery does not need a browser to recover.
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+RAW_DIR = Path(os.getenv("U24_RAW_DIR", BASE_DIR / 'data' / 'raw' / 'united24'))
+LINK_CACHE_PATH = Path(os.getenv("U24_LINK_CACHE_PATH", BASE_DIR / 'data' / 'cache' / 'united24' / 'report_links.json'))
+CACHE_COLUMNS = ('url', 'etag', 'last_modified', 'sha256', 'row_count', 'local_path', 'fetched_at')
+
+logger = logging.getLogger(__name__)
+
+
+def init_cache(conn):
+    """
+    Ensures the cache table exists. Commits on the given connection.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS u24_report_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            sha256 TEXT NOT NULL,
+            row_count INTEGER,
+            local_path TEXT,
+            fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    ''')
+    conn.commit()
+
+
+def load_entries(conn, urls):
+    """
+    Returns {url: entry_dict} for the given report URLs.
+    """
+    if not urls:
+        return {}
+
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(CACHE_COLUMNS)} FROM u24_report_cache WHERE url = ANY(%s)", (list(urls),))
+    return {row[0]: dict(zip(CACHE_COLUMNS, row)) for row in cursor.fetchall()}
+
+
+def is_reusable(entry):
+    """
+    A cached report can be skipped only if it was fully parsed and its raw copy still exists.
+    """
+    return bool(entry) and entry['row_count'] is not None and bool(entry['local_path']) \
+        and Path(entry['local_path']).exists()
+
+
+def conditional_headers(entry):
+    headers = {}
+    if is_reusable(entry):
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def content_sha256(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def save_raw_report(filename, content):
+    """
+    Writes the PDF to the local raw store atomically. Returns its path.
+    """
+    RAW_DIR.mkdir(parents=True, exist_ok=True)
+    path = RAW_DIR / filename
+    tmp_path = path.with_suffix('.part')
+    tmp_path.write_bytes(content)
+    tmp_path.replace(path)
+    return path
+
+
+def store_entry(url, etag, last_modified, sha256, row_count, local_path):
+    """
+    Upserts one cache entry through the shared bulk writer.
+    """
+    row = (url, etag, last_modified, sha256, row_count, str(local_path), datetime.now(timezone.utc))
+    bulk_insert('u24_report_cache', CACHE_COLUMNS, [row],
+                conflict_columns=('url',), update_columns=CACHE_COLUMNS[1:])
+    logger.info(f"Report cache: stored {url} ({row_count} rows, sha256 {sha256[:12]})")
+
+
+def load_link_cache():
+    """
+    Returns (links, age_in_hours) of the last successful discovery, or ([], None).
+    """
+    try:
+        payload = json.loads(LINK_CACHE_PATH.read_text())
+        fetched_at = datetime.fromisoformat(payload['fetched_at'])
+    except (OSError, ValueError, KeyError):
+        return [], None
+
+    age_hours = (datetime.now(timezone.utc) - fetched_at).total_seconds() / 3600
+    return payload.get('links', []), age_hours
+
+
+def save_link_cache(links):
+    LINK_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    payload = {'fetched_at': datetime.now(timezone.utc).isoformat(), 'links': sorted(links)}
+    # Per-process temp name: the per-category DAG tasks may refresh the cache concurrently
+    tmp_path = LINK_CACHE_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    tmp_path.write_text(json.dumps(payload, indent=2))
+    tmp_path.replace(LINK_CACHE_PATH)
@@ -1,19 +1,19 @@
 import os
 import re
-import io
-import zlib
+import sys
+import json
+import argparse
+import time
+import hashlib
 import requests
-import pdfplumber
 import logging
 from datetime import datetime, date
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
+from psycopg2 import sql
 from bs4 import BeautifulSoup
+from pathlib import Path
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-import psycopg2
-from psycopg2.extras import execute_values  # Added for bulk insert with return values
 from dotenv import load_dotenv
 
 # Setup logging
@@ -26,19 +26,58 @@ PG_URI = os.getenv("DATABASE_URL")
 if not PG_URI:
     raise ValueError("DATABASE_URL not found in environment variables")
 
-BASE_URL = "https://u24.gov.ua/reports"
-
-
-def get_latest_u24_date():
+SITE_URL = os.getenv("U24_SITE_URL", "https://u24.gov.ua")
+BASE_URL = f"{SITE_URL}/reports"
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from utils.pg_ingest import stage_rows, pooled_connection
+from processors.currency_conversion import apply_conversions
+from processors.rollups import refresh_rollups
+from scrapers.united24.report_cache import (
+    RAW_DIR, conditional_headers, init_cache, load_entries, is_reusable, content_sha256,
+    save_raw_report, store_entry, load_link_cache, save_link_cache
+)
+from utils.run_metrics import RunMetrics
+from utils import instrumentation
+from utils.u24_pdf_parser import count_pages, parse_report
+
+DONATION_COLUMNS = ('id', 'date', 'amount', 'currency', 'foundation_name', 'category')
+
+# Pipeline sizing: downloads are I/O bound, table extraction is CPU bound
+DOWNLOAD_WORKERS = int(os.getenv("U24_DOWNLOAD_WORKERS", "4"))
+PARSE_WORKERS = int(os.getenv("U24_PARSE_WORKERS", str(os.cpu_count() or 2)))
+PAGES_PER_TASK = 4
+MAX_REPORT_PAGES = 21
+
+# Report discovery
+DISCOVERY_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+}
+PDF_URL_PATTERN = re.compile(r'''(?:https?://[^\s"'<>()]+|/[^\s"'<>()]+)\.pdf(?:\?[^\s"'<>()]*)?''', re.IGNORECASE)
+LINK_CACHE_TTL_HOURS = int(os.getenv("U24_LINK_CACHE_TTL_HOURS", "24"))
+SELENIUM_WAIT_SECONDS = 15
+
+metrics = RunMetrics('extract_live_united24')
+
+
+def get_latest_u24_date(category=None):
     """
-    Retrieves the maximum date specifically for United24 records in the DB.
+    Retrieves the maximum date specifically for United24 records in the DB,
+    optionally for a single report category.
     """
-    conn = None
     try:
-        conn = psycopg2.connect(PG_URI)
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(date) FROM donations WHERE foundation_name = 'united24'")
-        res = cursor.fetchone()[0]
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            if category:
+                cursor.execute("SELECT MAX(date) FROM donations WHERE foundation_name = 'united24' AND category = %s",
+                               (category,))
+            else:
+                cursor.execute("SELECT MAX(date) FROM donations WHERE foundation_name = 'united24'")
+            res = cursor.fetchone()[0]
 
         if not res:
             return datetime.min
@@ -53,15 +92,50 @@ def get_latest_u24_date():
     except Exception as e:
         logging.error(f"Database check failed: {e}")
         return datetime.min
-    finally:
-        if conn:
-            conn.close()
 
 
-def get_report_links():
+def extract_report_links(html):
+    """
+    Collects report PDF URLs from anchors and from any URL embedded in inline scripts
+    (server-rendered page data), with JSON-escaped slashes undone.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    candidates = [a['href'] for a in soup.find_all('a', href=True)]
+    candidates += PDF_URL_PATTERN.findall(html.replace('\\/', '/'))
+
+    pdf_links = set()
+    for href in candidates:
+        if '.pdf' in href.lower() and 'report' in href.lower():
+            pdf_links.add(urljoin(SITE_URL, href))
+    return sorted(pdf_links)
+
+
+def get_report_links_http():
+    """
+    Fast path: a single plain HTTP request, no browser.
+    """
+    with instrumentation.timed('http_request', target='u24_reports_page'):
+        response = requests.get(BASE_URL, headers=DISCOVERY_HEADERS, timeout=30)
+    metrics.observe_response(response)
+    instrumentation.count_response('u24_reports_page', response)
+    response.raise_for_status()
+    return extract_report_links(response.text)
+
+
+def get_report_links_selenium():
     """
     Uses a headless Chrome driver to render the dynamic content and extract PDF URLs.
+    Selenium is imported here so that runs served by the fast path never load it.
     """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+    from webdriver_manager.chrome import ChromeDriverManager
+
     chrome_options = Options()
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--no-sandbox")
@@ -72,36 +146,197 @@ def get_report_links():
 
     try:
         driver.get(BASE_URL)
-        import time
-        time.sleep(5)
+        try:
+            # Wait for the first PDF anchor instead of a fixed sleep
+            WebDriverWait(driver, SELENIUM_WAIT_SECONDS).until(
+                expected_conditions.presence_of_element_located((By.CSS_SELECTOR, "a[href*='.pdf']"))
+            )
+        except TimeoutException:
+            logging.warning(f"No PDF anchors rendered within {SELENIUM_WAIT_SECONDS}s")
+
+        return extract_report_links(driver.page_source)
+    finally:
+        driver.quit()
+
+
+def get_report_links():
+    """
+    Report discovery: plain HTTP first, then a recent cached link set,
+    then headless Chrome, and finally any cached link set at all.
+    """
+    try:
+        links = get_report_links_http()
+        if links:
+            save_link_cache(links)
+            return links
+        logging.warning("HTTP discovery found no report links.")
+    except Exception as e:
+        logging.warning(f"HTTP discovery failed: {e}")
 
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        anchors = soup.find_all('a', href=True)
+    cached_links, age_hours = load_link_cache()
+    if cached_links and age_hours < LINK_CACHE_TTL_HOURS:
+        logging.info(f"Using {len(cached_links)} cached report links ({age_hours:.1f}h old).")
+        return cached_links
 
-        pdf_links = []
-        for a in anchors:
-            href = a['href']
-            if '.pdf' in href.lower() and 'report' in href.lower():
-                full_url = href if href.startswith('http') else f"https://u24.gov.ua{href}"
-                pdf_links.append(full_url)
+    try:
+        logging.info("Falling back to Selenium discovery...")
+        with instrumentation.timed('selenium_discovery'):
+            links = get_report_links_selenium()
+        if links:
+            save_link_cache(links)
+            return links
+    except Exception as e:
+        logging.error(f"Selenium discovery failed: {e}")
 
-        return list(set(pdf_links))
-    finally:
-        driver.quit()
+    if cached_links:
+        logging.warning(f"Using stale cached report links ({age_hours:.1f}h old).")
+    return cached_links
 
 
-def run_smart_sync():
+def download_report(url, entry=None):
     """
-    Orchestrates the discovery, downloading, and row-level synchronization.
+    Conditional GET against the cached validators.
+    Returns (status_code, content, etag, last_modified); content is None on 304.
+    """
+    with instrumentation.timed('http_request', target='u24_report_pdf'):
+        response = requests.get(url, headers=conditional_headers(entry), timeout=30)
+    metrics.observe_response(response)
+    instrumentation.count_response('u24_report_pdf', response)
+    if response.status_code == 304:
+        return 304, None, entry['etag'], entry['last_modified']
+
+    response.raise_for_status()
+    return (response.status_code, response.content,
+            response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+
+def count_report_pages(path):
+    return min(count_pages(path), MAX_REPORT_PAGES)
+
+
+def parse_page_range(path, first_page, last_page):
+    """
+    Extracts (date, amount_uah) rows from pages [first_page, last_page) of one stored report
+    with the shared U24_PDF_STRATEGY parser. Runs inside a parse worker process.
+    """
+    return [(day.isoformat(), amount_uah) for day, amount_uah, _ in parse_report(path, first_page, last_page)]
+
+
+def parse_range_task(path, first_page, last_page):
+    """
+    Parse worker entry point: the rows of a page range plus the worker's instrumentation samples.
+    """
+    return parse_page_range(path, first_page, last_page), instrumentation.collect()
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def record_id(date_str, amount, category):
+    """
+    Deterministic signed 64-bit key (fits BIGINT). Replaces crc32, whose 32-bit
+    space collides at our volume.
     """
-    last_db_date = get_latest_u24_date()
-    logging.info(f"Last United24 entry in DB: {last_db_date.strftime('%Y-%m-%d')}")
+    unique_str = f"u24_{date_str}_{amount}_{category}"
+    digest = hashlib.blake2b(unique_str.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
 
-    links = get_report_links()
-    logging.info(f"Discovered {len(links)} potential reports on the platform.")
 
-    records_added = 0
+def init_u24_schema(conn):
+    """
+    Index backing the (foundation_name, category, date) anti-join. Commits.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_donations_fcd ON donations (foundation_name, category, date)"
+    )
+    conn.commit()
+
 
+class ReportWriter:
+    """
+    Inserts parsed rows as soon as each parse task finishes.
+    Deduplication runs in the database: rows are staged via COPY and only dates not yet
+    stored for their (foundation_name, category) are inserted.
+    """
+
+    def __init__(self):
+        self.records_added = 0
+        self.earliest_inserted = None
+
+    def write(self, category, parsed_rows):
+        rows = [
+            (record_id(date_str, amount, category), date_str, amount, 'UAH', 'united24', category)
+            for date_str, amount in parsed_rows
+        ]
+        if not rows:
+            return 0
+
+        with metrics.stage('insert'), pooled_connection() as conn:
+            cursor = conn.cursor()
+            staging_name, _ = stage_rows(cursor, 'donations', DONATION_COLUMNS, rows)
+
+            column_list = sql.SQL(', ').join(map(sql.Identifier, DONATION_COLUMNS))
+            with instrumentation.timed('db_insert', table='donations'):
+                cursor.execute(sql.SQL("""
+                    WITH moved AS (
+                        INSERT INTO donations ({columns})
+                        SELECT {columns} FROM {staging} s
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM donations d
+                            WHERE d.foundation_name = s.foundation_name
+                              AND d.category = s.category
+                              AND d.date = s.date
+                        )
+                        ON CONFLICT (id) DO NOTHING
+                        RETURNING date
+                    )
+                    SELECT COUNT(*), MIN(date) FROM moved
+                """).format(columns=column_list, staging=sql.Identifier(staging_name)))
+                count, batch_earliest = cursor.fetchone()
+            instrumentation.count('db_rows_inserted', count, table='donations')
+            conn.commit()
+
+        self.records_added += count
+        if batch_earliest:
+            self.earliest_inserted = min(filter(None, (self.earliest_inserted, batch_earliest)))
+        return count
+
+
+class ReportJob:
+    """
+    Tracks the parse ranges of one report; the cache entry of a downloaded report
+    is written only once every range has been parsed and inserted.
+    """
+
+    def __init__(self, url, filename, category, entry=None):
+        self.url = url
+        self.filename = filename
+        self.category = category
+        self.entry = entry
+        self.remaining = 0
+        self.row_count = 0
+        self.failed = False
+        self.validators = None
+
+    def finish_range(self, row_count=0, failed=False):
+        self.remaining -= 1
+        self.row_count += row_count
+        self.failed = self.failed or failed
+        if self.remaining == 0 and not self.failed and self.validators:
+            store_entry(self.url, *self.validators, self.row_count, self.local_path)
+
+    @property
+    def local_path(self):
+        return RAW_DIR / self.filename
+
+
+def select_reports(links, last_db_date):
+    """
+    Returns (url, filename, category) for reports dated on or after the last stored entry.
+    """
+    reports = []
     for url in links:
         filename = os.path.basename(url).split('?')[0]
         date_match = re.search(r'(\d{8})', filename)
@@ -112,87 +347,173 @@ def run_smart_sync():
         category = os.path.splitext(filename.split('-')[-1])[0].lower()
 
         if file_date >= last_db_date:
-            logging.info(f"Processing report: {filename}")
-            try:
-                response = requests.get(url, timeout=30)
-                response.raise_for_status()
-
-                parsed_rows = []
-                with pdfplumber.open(io.BytesIO(response.content)) as pdf:
-                    for page in pdf.pages[:21]:
-                        table = page.extract_table()
-                        if not table:
-                            continue
-
-                        for row in table:
-                            try:
-                                if not re.match(r'^\d{2}\.\d{2}\.\d{4}$', row[0]):
-                                    continue
-
-                                amount = float(row[1].replace(' ', '').replace(',', '.'))
-                                date_str = datetime.strptime(row[0], '%d.%m.%Y').strftime('%Y-%m-%d')
-
-                                parsed_rows.append({
-                                    'date': date_str,
-                                    'amount': amount,
-                                    'category': category
-                                })
-                            except (ValueError, IndexError, TypeError):
-                                continue
-
-                if parsed_rows:
-                    conn = psycopg2.connect(PG_URI)
-                    try:
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "SELECT date FROM donations WHERE foundation_name='united24' AND category=%s",
-                            (category,)
-                        )
+            reports.append((url, filename, category))
+    return reports
 
-                        known_dates = set()
-                        for db_row in cursor.fetchall():
-                            d = db_row[0]
-                            if isinstance(d, (datetime, date)):
-                                known_dates.add(d.strftime('%Y-%m-%d'))
-                            else:
-                                known_dates.add(str(d).split(' ')[0])
-
-                        to_insert = []
-                        for r in parsed_rows:
-                            if r['date'] not in known_dates:
-                                unique_str = f"u24_{r['date']}_{r['amount']}_{r['category']}"
-                                record_id = zlib.crc32(unique_str.encode('utf-8'))
-
-                                to_insert.append((
-                                    record_id, r['date'], r['amount'], 'UAH', 'united24', r['category']
-                                ))
-
-                        if to_insert:
-                            # Using execute_values with RETURNING clause ensures we only count
-                            # rows that bypassed the ON CONFLICT constraint and were physically inserted.
-                            query = """
-                                INSERT INTO donations (id, date, amount, currency, foundation_name, category) 
-                                VALUES %s
-                                ON CONFLICT (id) DO NOTHING
-                                RETURNING id
-                            """
-                            # fetch=True returns the data specified in RETURNING
-                            inserted_rows = execute_values(cursor, query, to_insert, fetch=True)
-                            conn.commit()
-
-                            if inserted_rows:
-                                records_added += len(inserted_rows)
-                    finally:
-                        conn.close()
 
-            except Exception as e:
-                logging.error(f"Error processing {filename}: {e}")
+def list_report_categories():
+    """
+    Categories of every report linked from the platform, for the per-category DAG tasks.
+    """
+    with metrics.stage('discover'):
+        links = get_report_links()
+    return sorted({category for _, _, category in select_reports(links, datetime.min)})
 
-    logging.info(f"Sync finalized. {records_added} new entries pushed to master database.")
 
-    # Technical Note: Final stdout line for Airflow XCom telemetry consumption
-    print(records_added)
+def local_reports():
+    """
+    Offline mode: every PDF already in the raw store, keyed by its original file name.
+    """
+    return [
+        (path.as_uri(), path.name, os.path.splitext(path.name.split('-')[-1])[0].lower())
+        for path in sorted(RAW_DIR.glob('*.pdf'))
+    ]
+
+
+def submit_parse_ranges(parsers, job):
+    page_count = count_report_pages(job.local_path)
+    logging.info(f"Parsing report: {job.filename} ({page_count} pages)")
+
+    futures = []
+    for first_page in range(0, page_count, PAGES_PER_TASK):
+        futures.append(parsers.submit(
+            parse_range_task, str(job.local_path), first_page, first_page + PAGES_PER_TASK
+        ))
+    job.remaining = len(futures)
+    return futures
+
+
+def handle_download(job, result):
+    """
+    Stores a fresh download in the raw store. Returns True if the report needs parsing.
+    """
+    status_code, content, etag, last_modified = result
+    if status_code == 304:
+        logging.info(f"Report unchanged (304): {job.filename}. Skipping.")
+        metrics.incr('reports_unchanged')
+        return False
+
+    sha256 = content_sha256(content)
+    save_raw_report(job.filename, content)
+
+    if is_reusable(job.entry) and job.entry['sha256'] == sha256:
+        logging.info(f"Report content unchanged (sha256): {job.filename}. Skipping.")
+        metrics.incr('reports_unchanged')
+        store_entry(job.url, etag, last_modified, sha256, job.entry['row_count'], job.local_path)
+        return False
+
+    job.validators = (etag, last_modified, sha256)
+    return True
+
+
+def run_smart_sync(download_workers=DOWNLOAD_WORKERS, parse_workers=PARSE_WORKERS, offline=False,
+                   category=None, defer_post_process=False):
+    """
+    Orchestrates the discovery, downloading, and row-level synchronization.
+    Downloads run in a thread pool while finished reports are split into page ranges
+    and parsed in a process pool; rows are written as each range completes.
+    Reports whose content has not changed since the last run are not parsed again.
+    With offline=True the PDFs in the raw store are re-parsed without any network access.
+    With `category` only that category's reports are synced (one DAG task per category).
+    With defer_post_process=True conversion and rollups are left to processors/post_ingest.py.
+    """
+    last_db_date = get_latest_u24_date(category)
+    logging.info(f"Last United24 entry in DB{f' for {category}' if category else ''}: "
+                 f"{last_db_date.strftime('%Y-%m-%d')}")
+
+    if offline:
+        reports = local_reports()
+        logging.info(f"Offline mode: {len(reports)} reports in {RAW_DIR}")
+    else:
+        with metrics.stage('discover'):
+            links = get_report_links()
+        logging.info(f"Discovered {len(links)} potential reports on the platform.")
+        reports = select_reports(links, last_db_date)
+
+    if category:
+        reports = [report for report in reports if report[2] == category]
+
+    with pooled_connection() as conn:
+        init_cache(conn)
+        init_u24_schema(conn)
+        entries = {} if offline else load_entries(conn, [url for url, _, _ in reports])
+
+    jobs = [ReportJob(url, filename, category, entries.get(url)) for url, filename, category in reports]
+    writer = ReportWriter()
+    started = time.perf_counter()
+
+    with metrics.stage('pipeline'), ProcessPoolExecutor(max_workers=parse_workers) as parsers:
+        # Technical Note: fork the parse workers before any download thread exists;
+        # forking a multi-threaded process can deadlock on locks held by other threads.
+        parsers.submit(_warm_up).result()
+
+        with ThreadPoolExecutor(max_workers=download_workers) as downloads:
+            tasks = {}
+            for job in jobs:
+                if offline:
+                    tasks.update((f, ('parse', job)) for f in submit_parse_ranges(parsers, job))
+                else:
+                    logging.info(f"Downloading report: {job.filename}")
+                    tasks[downloads.submit(download_report, job.url, job.entry)] = ('download', job)
+
+            pending = set(tasks)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, job = tasks.pop(future)
+                    try:
+                        if kind == 'download':
+                            if handle_download(job, future.result()):
+                                for parse_future in submit_parse_ranges(parsers, job):
+                                    tasks[parse_future] = ('parse', job)
+                                    pending.add(parse_future)
+                        else:
+                            parsed_rows, samples = future.result()
+                            instrumentation.merge(samples)
+                            metrics.incr('rows_fetched', len(parsed_rows))
+                            writer.write(job.category, parsed_rows)
+                            job.finish_range(len(parsed_rows))
+                    except Exception as e:
+                        logging.error(f"Error processing {job.filename}: {e}")
+                        if kind == 'parse':
+                            job.finish_range(failed=True)
+
+    elapsed = time.perf_counter() - started
+    logging.info(f"Sync finalized in {elapsed:.1f}s. "
+                 f"{writer.records_added} new entries pushed to master database.")
+
+    if writer.earliest_inserted:
+        metrics.note_changed_since(writer.earliest_inserted)
+        if defer_post_process:
+            logging.info(f"Conversion and rollups from {writer.earliest_inserted} deferred to the post-ingest task")
+        else:
+            try:
+                with metrics.stage('post_process'):
+                    apply_conversions(since=writer.earliest_inserted)
+                    refresh_rollups(since=writer.earliest_inserted)
+            except Exception as e:
+                logging.error(f"Amount conversion or rollup refresh failed: {e}")
+
+    # Technical Note: Final stdout line (JSON metrics record) for Airflow XCom telemetry consumption
+    metrics.incr('rows_inserted', writer.records_added)
+    metrics.incr('rows_skipped', metrics.as_record()['rows_fetched'] - writer.records_added)
+    metrics.emit()
 
 
 if __name__ == "__main__":
-    run_smart_sync()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="United24 report sync")
+    parser.add_argument('--offline', action='store_true',
+                        help="Re-parse the PDFs already stored in data/raw/united24 without network access")
+    parser.add_argument('--category', help="Sync only this report category (e.g. health, zsu)")
+    parser.add_argument('--list-categories', action='store_true',
+                        help="Only discover reports and print their categories as a JSON list")
+    parser.add_argument('--defer-post-process', action='store_true',
+                        help="Skip conversion and rollups; processors/post_ingest.py runs them later")
+    args = parser.parse_args()
+
+    if args.list_categories:
+        # Technical Note: Final stdout line (JSON list of categories) is the XCom the DAG maps over
+        print(json.dumps(list_report_categories()), flush=True)
+    else:
+        run_smart_sync(offline=args.offline, category=args.category and args.category.lower(),
+                       defer_post_process=args.defer_post_process)
\ No newline at end of file
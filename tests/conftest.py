@@ -0,0 +1,36 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+
+@pytest.fixture
+def pg_conn():
+    """
+    psycopg2 connection whose search_path is a throwaway schema, dropped afterwards.
+    Needs TEST_DATABASE_URL; the test is skipped without it.
+    """
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL not set")
+    psycopg2 = pytest.importorskip("psycopg2")
+
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    conn = psycopg2.connect(url)
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE SCHEMA {schema}")
+    cursor.execute(f"SET search_path TO {schema}")
+    conn.commit()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.cursor().execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.commit()
+        conn.close()
@@ -0,0 +1,67 @@
+from decimal import Decimal
+
+from processors.currency_conversion import (
+    init_conversion_schema, refresh_filled_rates, backfill_converted_amounts
+)
+
+
+def _create_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE donations (
+            id BIGINT PRIMARY KEY, amount REAL, currency TEXT, date DATE,
+            comment TEXT, source TEXT, foundation_name TEXT, category TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE exchange_rates (
+            date DATE NOT NULL, currency TEXT NOT NULL, rate_uah REAL, PRIMARY KEY (date, currency)
+        )
+    ''')
+    cursor.executemany("INSERT INTO exchange_rates VALUES (%s, %s, %s)", [
+        ('2026-03-02', 'EUR', 45.0),  # Monday
+        ('2026-03-02', 'USD', 40.0),
+        ('2026-03-06', 'EUR', 46.0),  # Friday; nothing is published for the weekend after it
+        ('2026-03-06', 'USD', 41.0),
+    ])
+    conn.commit()
+
+
+def _converted(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, amount_eur, amount_usd FROM donations ORDER BY id")
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+
+def test_amounts_are_converted_from_their_own_currency(pg_conn):
+    _create_tables(pg_conn)
+    cursor = pg_conn.cursor()
+    cursor.executemany("INSERT INTO donations (id, amount, currency, date) VALUES (%s, %s, %s, %s)", [
+        (1, 900.0, 'UAH', '2026-03-02'),
+        (2, 100.0, 'USD', '2026-03-02'),
+        (3, 100.0, 'EUR', '2026-03-07'),  # Saturday: forward-filled Friday rates
+        (4, 100.0, 'XYZ', '2026-03-02'),  # no NBU rate for the source currency
+    ])
+    init_conversion_schema(pg_conn)
+
+    refresh_filled_rates(pg_conn, '2026-03-02')
+    backfill_converted_amounts(pg_conn, '2026-03-02')
+    pg_conn.commit()
+
+    converted = _converted(pg_conn)
+    assert converted[1] == (Decimal('20.00'), Decimal('22.50'))
+    assert converted[2] == (Decimal('88.89'), Decimal('100.00'))
+    assert converted[3] == (Decimal('100.00'), Decimal('112.20'))
+    assert converted[4] == (None, None)
+
+
+def test_rerun_leaves_unchanged_rows_untouched(pg_conn):
+    _create_tables(pg_conn)
+    pg_conn.cursor().execute(
+        "INSERT INTO donations (id, amount, currency, date) VALUES (1, 100.0, 'USD', '2026-03-02')"
+    )
+    init_conversion_schema(pg_conn)
+    refresh_filled_rates(pg_conn, '2026-03-02')
+
+    assert backfill_converted_amounts(pg_conn, '2026-03-02') == {'amount_eur': 1, 'amount_usd': 1}
+    assert backfill_converted_amounts(pg_conn, '2026-03-02') == {'amount_eur': 0, 'amount_usd': 0}
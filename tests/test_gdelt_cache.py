@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from scrapers.news.gdelt_cache import FINAL_AFTER_DAYS, GdeltDayCache, LocalFixtureBackend
+
+
+class CountingBackend(LocalFixtureBackend):
+    """LocalFixtureBackend that records every (date_from, date_to) it is asked for."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.calls = []
+
+    def fetch(self, date_from, date_to):
+        self.calls.append((date_from, date_to))
+        return super().fetch(date_from, date_to)
+
+
+@pytest.fixture
+def today():
+    return datetime.now(timezone.utc).date()
+
+
+@pytest.fixture
+def cache(tmp_path, today):
+    rows = [
+        (today - timedelta(days=10), 'theguardian.com', 'https://example.org/a'),
+        (today - timedelta(days=10), 'kyivindependent.com', 'https://example.org/b'),
+        (today - timedelta(days=8), 'theguardian.com', 'https://example.org/c'),
+        (today, 'kyivindependent.com', 'https://example.org/d'),
+    ]
+    fixture = tmp_path / 'gdelt.csv'
+    fixture.write_text('event_date,source,url\n' + ''.join(f"{d.isoformat()},{s},{u}\n" for d, s, u in rows))
+    return GdeltDayCache(CountingBackend(fixture), cache_dir=tmp_path / 'cache')
+
+
+def test_missing_ranges_skips_only_final_cached_days(cache, today):
+    start = today - timedelta(days=10)
+    assert cache.missing_ranges(start, today) == [(start, today)]
+
+    cache.refresh(start, today)
+
+    # Cached days stay missing until they are FINAL_AFTER_DAYS old
+    assert cache.missing_ranges(start, today) == [(today - timedelta(days=FINAL_AFTER_DAYS - 1), today)]
+
+
+def test_missing_ranges_groups_gaps(cache, today):
+    start = today - timedelta(days=10)
+    cache.refresh(start, start + timedelta(days=1))
+    cache.refresh(start + timedelta(days=4), start + timedelta(days=4))
+
+    assert cache.missing_ranges(start, start + timedelta(days=5)) == [
+        (start + timedelta(days=2), start + timedelta(days=3)),
+        (start + timedelta(days=5), start + timedelta(days=5)),
+    ]
+
+
+def test_empty_days_are_cached_and_not_queried_again(cache, today):
+    empty_day = today - timedelta(days=9)
+
+    assert cache.refresh(empty_day, empty_day) == 1
+    assert cache.partition_path(empty_day).exists()
+
+    assert cache.refresh(empty_day, empty_day) == 0
+    assert cache.backend.calls == [(empty_day, empty_day)]
+
+
+def test_load_returns_fixture_rows_of_the_window(cache, today):
+    frame = cache.load(today - timedelta(days=10), today - timedelta(days=8))
+
+    assert sorted(frame['url']) == ['https://example.org/a', 'https://example.org/b', 'https://example.org/c']
+    assert frame['event_date'].tolist()[0] == (today - timedelta(days=8)).isoformat()
+
+    # A second load of the same final window is served from the cache alone
+    calls = len(cache.backend.calls)
+    assert len(cache.load(today - timedelta(days=10), today - timedelta(days=8))) == 3
+    assert len(cache.backend.calls) == calls
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+from scrapers.news.headline_cache import NEGATIVE_TTL_HOURS, init_cache, lookup_cached, normalize_url
+
+CANONICAL = 'https://example.org/news/article?id=7&page=2'
+
+
+def test_normalize_url_collapses_variants():
+    variants = [
+        'https://example.org/news/article?id=7&page=2',
+        'HTTPS://Example.ORG/news/article/?page=2&id=7',
+        'https://example.org:443/news/article?id=7&page=2#comments',
+        'https://example.org/news/article?utm_source=tw&id=7&fbclid=abc&page=2&UTM_MEDIUM=x',
+        '  https://example.org/news/article?id=7&page=2&ref=home  ',
+    ]
+    assert {normalize_url(url) for url in variants} == {CANONICAL}
+
+
+def test_normalize_url_keeps_what_identifies_the_article():
+    assert normalize_url('https://example.org/article?id=8') != normalize_url('https://example.org/article?id=7')
+    assert normalize_url('http://example.org/a') != normalize_url('https://example.org/a')
+    assert normalize_url('https://example.org:8443/a') == 'https://example.org:8443/a'
+    assert normalize_url('https://example.org') == 'https://example.org/'
+
+
+def _store(conn, url, headline, status, age_hours):
+    conn.cursor().execute(
+        "INSERT INTO news_headline_cache (url, headline, status, fetched_at) VALUES (%s, %s, %s, %s)",
+        (url, headline, status, datetime.now(timezone.utc) - timedelta(hours=age_hours))
+    )
+    conn.commit()
+
+
+def test_ok_entries_are_reused_forever(pg_conn):
+    init_cache(pg_conn)
+    _store(pg_conn, 'https://example.org/old', 'Old headline', 'ok', age_hours=24 * 365)
+
+    assert lookup_cached(pg_conn, ['https://example.org/old']) == {
+        'https://example.org/old': ('Old headline', 'ok')
+    }
+
+
+def test_failures_expire_after_negative_ttl(pg_conn):
+    init_cache(pg_conn)
+    _store(pg_conn, 'https://example.org/recent-404', None, 'http_404', age_hours=NEGATIVE_TTL_HOURS - 1)
+    _store(pg_conn, 'https://example.org/stale-error', None, 'error', age_hours=NEGATIVE_TTL_HOURS + 1)
+    _store(pg_conn, 'https://example.org/stale-empty', None, 'no_headline', age_hours=NEGATIVE_TTL_HOURS + 1)
+
+    cached = lookup_cached(pg_conn, [
+        'https://example.org/recent-404', 'https://example.org/stale-error',
+        'https://example.org/stale-empty', 'https://example.org/never-seen',
+    ])
+
+    # Only the failure younger than the TTL is served; the rest are due for a retry
+    assert cached == {'https://example.org/recent-404': (None, 'http_404')}
+
+
+def test_lookup_without_urls_skips_the_query(pg_conn):
+    assert lookup_cached(pg_conn, []) == {}
@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+import pyarrow.parquet as pq
+
+from processors import parquet_export
+
+
+def test_partitions_share_one_schema_and_read_back(pg_conn, tmp_path, monkeypatch):
+    monkeypatch.setattr(parquet_export, 'LAKE_DIR', tmp_path)
+    cursor = pg_conn.cursor()
+    cursor.execute('''
+        CREATE TABLE donations (
+            id BIGINT PRIMARY KEY, amount REAL, currency TEXT, date DATE, comment TEXT,
+            source TEXT, foundation_name TEXT, category TEXT,
+            amount_eur NUMERIC(14, 2), amount_usd NUMERIC(14, 2)
+        )
+    ''')
+    cursor.executemany("INSERT INTO donations VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", [
+        # March: small amounts, no USD amounts, no comments or categories at all
+        (1, 100.0, 'UAH', '2026-03-02', None, 'monobank', 'come_back_alive', None, Decimal('2.31'), None),
+        (2, 50.0, None, '2026-03-05', None, None, 'come_back_alive', None, None, None),
+        # April: large amounts and every column filled
+        (3, 1e6, 'USD', '2026-04-01', 'Slava Ukraini', 'swift', 'come_back_alive', 'general',
+         Decimal('23456.78'), Decimal('25000.00')),
+    ])
+    pg_conn.commit()
+
+    manifest = {}
+    assert parquet_export.export_table(pg_conn, 'donations', manifest) == 3
+    assert len(manifest['donations']) == 2
+
+    df = parquet_export.load_lake_table(
+        'donations', ['id', 'amount_eur', 'amount_usd', 'comment', 'currency'],
+        [('foundation_name', '=', 'come_back_alive')]
+    ).sort_values('id')
+
+    assert df['amount_eur'].tolist() == [Decimal('2.31'), None, Decimal('23456.78')]
+    assert df['amount_usd'].tolist()[2] == Decimal('25000.00')
+    assert df['comment'].tolist()[2] == 'Slava Ukraini'
+    assert df['currency'].isna().tolist() == [False, True, False]
+    assert df['currency'].tolist()[2] == 'USD'
+
+    schemas = {str(pq.read_schema(path)) for path in tmp_path.glob('donations/**/*.parquet')}
+    assert len(schemas) == 1
@@ -0,0 +1,114 @@
+import logging
+
+# Page-level progress of paginated API syncs, keyed by job name and query window.
+# Writers save a checkpoint in the same transaction as the rows of that page,
+# so a restarted run never skips or re-counts a committed page.
+
+
+def init_checkpoints(conn):
+    """
+    Ensures the checkpoint table exists. Commits on the given connection.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+            job TEXT NOT NULL,
+            window_from TEXT NOT NULL,
+            window_to TEXT NOT NULL,
+            last_page INTEGER NOT NULL DEFAULT 0,
+            total_pages INTEGER,
+            rows_inserted BIGINT NOT NULL DEFAULT 0,
+            completed BOOLEAN NOT NULL DEFAULT FALSE,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (job, window_from, window_to)
+        )
+    ''')
+    conn.commit()
+
+
+def _row_to_checkpoint(row):
+    return {
+        'job': row[0],
+        'window_from': row[1],
+        'window_to': row[2],
+        'last_page': row[3],
+        'total_pages': row[4],
+        'rows_inserted': row[5],
+        'completed': row[6],
+    }
+
+
+def load_checkpoint(conn, job, window_from, window_to):
+    """
+    Returns the checkpoint of an exact window as a dict, or None if it was never started.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT job, window_from, window_to, last_page, total_pages, rows_inserted, completed
+        FROM ingest_checkpoints
+        WHERE job = %s AND window_from = %s AND window_to = %s
+    ''', (job, window_from, window_to))
+    row = cursor.fetchone()
+    return _row_to_checkpoint(row) if row else None
+
+
+def save_checkpoint(conn, job, window_from, window_to, last_page, total_pages=None,
+                    rows_inserted=0, completed=False):
+    """
+    Upserts window progress without committing.
+    The caller commits together with the rows of `last_page`.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO ingest_checkpoints
+            (job, window_from, window_to, last_page, total_pages, rows_inserted, completed, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (job, window_from, window_to) DO UPDATE
+        SET last_page = EXCLUDED.last_page,
+            total_pages = COALESCE(EXCLUDED.total_pages, ingest_checkpoints.total_pages),
+            rows_inserted = EXCLUDED.rows_inserted,
+            completed = EXCLUDED.completed,
+            updated_at = NOW()
+    ''', (job, window_from, window_to, last_page, total_pages, rows_inserted, completed))
+    logging.debug(f"Checkpoint {job} [{window_from} .. {window_to}] -> page {last_page}")
+
+
+def find_open_checkpoint(conn, job):
+    """
+    Returns the most recently updated unfinished checkpoint of a job, or None.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT job, window_from, window_to, last_page, total_pages, rows_inserted, completed
+        FROM ingest_checkpoints
+        WHERE job = %s AND NOT completed
+        ORDER BY updated_at DESC
+        LIMIT 1
+    ''', (job,))
+    row = cursor.fetchone()
+    return _row_to_checkpoint(row) if row else None
+
+
+def list_open_checkpoints(conn, job):
+    """
+    Returns every unfinished checkpoint of a job, oldest window first.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT job, window_from, window_to, last_page, total_pages, rows_inserted, completed
+        FROM ingest_checkpoints
+        WHERE job = %s AND NOT completed
+        ORDER BY window_from
+    ''', (job,))
+    return [_row_to_checkpoint(row) for row in cursor.fetchall()]
+
+
+def delete_checkpoint(conn, job, window_from, window_to):
+    """
+    Removes the checkpoint of a window that was superseded by a new plan, without committing.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        DELETE FROM ingest_checkpoints
+        WHERE job = %s AND window_from = %s AND window_to = %s
+    ''', (job, window_from, window_to))
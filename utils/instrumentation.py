@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+import atexit
+import socket
+import threading
+import multiprocessing
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+# Hot-path instrumentation in the Prometheus text exposition format.
+# Counters and latency histograms are kept in process memory and written once, at exit,
+# to METRICS_TEXTFILE_DIR/<task>.prom for node-exporter's textfile collector
+# (--collector.textfile.directory). Every series carries `task` and `host` labels.
+#
+# Without METRICS_TEXTFILE_DIR every call returns immediately: timed() hands back a shared
+# no-op context manager and nothing is allocated, so the wrappers can stay in hot loops.
+#
+# Worker processes cannot write the file themselves (forked pool workers skip atexit and
+# would overwrite each other): they return collect() with their results and the parent
+# folds the samples in with merge().
+
+TEXTFILE_DIR = os.getenv("METRICS_TEXTFILE_DIR")
+ENABLED = bool(TEXTFILE_DIR)
+# Mapped DAG tasks share one task id; the DAG passes the map index so each instance
+# gets its own `shard` label and textfile instead of overwriting its siblings
+SHARD = os.getenv("METRICS_SHARD") or None
+METRIC_PREFIX = 'uaaid_'
+
+# Upper bounds in seconds: sub-millisecond DB round-trips up to multi-minute back-off sleeps
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_NULL_TIMER = nullcontext()
+_lock = threading.Lock()
+_state = {'pid': None, 'counters': {}, 'histograms': {}}
+_task = None
+
+
+def _default_task():
+    # BashOperator exports the task context; manual runs fall back to the script name
+    return os.getenv("AIRFLOW_CTX_TASK_ID") or os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+
+
+def configure(task):
+    """
+    Overrides the `task` label (and the textfile name) of this process.
+    """
+    global _task
+    _task = task
+
+
+def _samples():
+    # Samples inherited through fork() belong to the parent and are dropped in the child
+    if _state['pid'] != os.getpid():
+        _state.update(pid=os.getpid(), counters={}, histograms={})
+    return _state
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def count(name, value=1, **labels):
+    """
+    Adds `value` to the counter `name` (exported as <prefix><name>_total).
+    """
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        counters = _samples()['counters']
+        counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """
+    Records one duration in the histogram `name` (exported as <prefix><name>_seconds).
+    """
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histograms = _samples()['histograms']
+        hist = histograms.get(key)
+        if hist is None:
+            hist = histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+        hist[0][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        hist[1] += seconds
+        hist[2] += 1
+
+
+@contextmanager
+def _timer(name, labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def timed(name, **labels):
+    """
+    Context manager observing the duration of its block in the histogram `name`.
+    Exceptions are timed too; label failures separately with count() where it matters.
+    """
+    if not ENABLED:
+        return _NULL_TIMER
+    return _timer(name, labels)
+
+
+def count_response(target, response):
+    """
+    Counts one HTTP response by status code, plus the bytes of its body.
+    """
+    if not ENABLED:
+        return
+    count('http_responses', target=target, code=response.status_code)
+    count('http_response_bytes', len(response.content or b''), target=target)
+
+
+def count_sleep(reason, seconds):
+    """
+    Adds deliberate waiting (rate limits, 429 back-off, retry pauses) to sleep_seconds_total.
+    """
+    count('sleep_seconds', seconds, reason=reason)
+
+
+def collect():
+    """
+    Returns and clears the samples of this process, for shipping back from a worker process.
+    """
+    if not ENABLED:
+        return None
+    with _lock:
+        state = _samples()
+        samples = {'counters': state['counters'], 'histograms': state['histograms']}
+        state['counters'], state['histograms'] = {}, {}
+    return samples
+
+
+def merge(samples):
+    """
+    Adds samples returned by collect() in another process.
+    """
+    if not ENABLED or not samples:
+        return
+    with _lock:
+        state = _samples()
+        for key, value in samples['counters'].items():
+            state['counters'][key] = state['counters'].get(key, 0) + value
+        for key, (buckets, total, n) in samples['histograms'].items():
+            hist = state['histograms'].setdefault(key, [[0] * len(buckets), 0.0, 0])
+            hist[0] = [a + b for a, b in zip(hist[0], buckets)]
+            hist[1] += total
+            hist[2] += n
+
+
+def _format_labels(labels):
+    escaped = (
+        (k, v.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')) for k, v in labels
+    )
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def render():
+    """
+    Renders every sample of this process in the Prometheus text format.
+    """
+    base = (('host', socket.gethostname()), ('task', _task or _default_task()))
+    if SHARD is not None:
+        base += (('shard', SHARD),)
+    with _lock:
+        state = _samples()
+        counters = sorted(state['counters'].items())
+        histograms = sorted(state['histograms'].items())
+
+    lines = []
+    typed = set()
+    for (name, labels), value in counters:
+        metric = f"{METRIC_PREFIX}{name}_total"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_format_labels(base + labels)} {value}")
+
+    for (name, labels), (buckets, total, n) in histograms:
+        metric = f"{METRIC_PREFIX}{name}_seconds"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+            cumulative += bucket_count
+            lines.append(f"{metric}_bucket{_format_labels(base + labels + (('le', str(bound)),))} {cumulative}")
+        lines.append(f"{metric}_sum{_format_labels(base + labels)} {total:.6f}")
+        lines.append(f"{metric}_count{_format_labels(base + labels)} {n}")
+
+    metric = f"{METRIC_PREFIX}last_run_timestamp_seconds"
+    lines.append(f"# TYPE {metric} gauge")
+    lines.append(f"{metric}{_format_labels(base)} {time.time():.0f}")
+    return '\n'.join(lines) + '\n'
+
+
+def flush():
+    """
+    Writes the textfile atomically (node-exporter must never read a half-written file).
+    Runs at exit of the main process only; pool workers report through collect().
+    """
+    if not ENABLED or multiprocessing.parent_process() is not None:
+        return
+
+    os.makedirs(TEXTFILE_DIR, exist_ok=True)
+    name = _task or _default_task()
+    target = os.path.join(TEXTFILE_DIR, f"{name}.{SHARD}.prom" if SHARD is not None else f"{name}.prom")
+    temp_path = f"{target}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(render())
+    os.replace(temp_path, target)
+
+
+if ENABLED:
+    atexit.register(flush)
@@ -1,7 +1,188 @@
 import os
-import re
-import pdfplumber
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+INPUT_DIR = os.path.join(PROJECT_ROOT, "data", "raw", "united24")
+DATASET_DIR = os.path.join(PROJECT_ROOT, "data", "processed", "u24_dataset")
+MANIFEST_PATH = os.path.join(DATASET_DIR, "_manifest.json")
+# Consumed by legacy_pdf_to_csv_converter.py
+MASTER_CSV_PATH = os.path.join(INPUT_DIR, "u24_master_dataset.csv")
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from utils.u24_pdf_parser import iter_report_pages
+
+# Typed schema of the Parquet dataset; `category` is the partition key (category=<name>/)
+DATASET_SCHEMA = pa.schema([
+    ('date', pa.date32()),
+    ('amount_uah', pa.float64()),
+    ('amount_usd', pa.float64()),
+    ('fund_name', pa.dictionary(pa.int8(), pa.string())),
+])
+PARQUET_COMPRESSION = 'zstd'
+
+
+def report_category(filename):
+    # Splits 'report-date-health.pdf' by '-' and takes the last part without the extension
+    return os.path.splitext(filename.split('-')[-1])[0].lower()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def convert_report(file_path, output_path):
+    """
+    Parses one PDF in a worker process and streams its records, page by page,
+    into a single Parquet file. Returns the number of records written.
+    """
+    # The '_' prefix hides a partial file (e.g. of a killed worker) from dataset reads
+    tmp_path = os.path.join(os.path.dirname(output_path), f"_{os.path.basename(output_path)}.tmp")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    rows_written = 0
+    with pq.ParquetWriter(tmp_path, DATASET_SCHEMA, compression=PARQUET_COMPRESSION) as writer:
+        for records in iter_report_pages(file_path):
+            if not records:
+                continue
+
+            dates, uah, usd = zip(*records)
+            writer.write_batch(pa.record_batch([
+                pa.array(dates, pa.date32()),
+                pa.array(uah, pa.float64()),
+                pa.array(usd, pa.float64()),
+                pa.array(['United24'] * len(records)).dictionary_encode().cast(DATASET_SCHEMA.field('fund_name').type),
+            ], schema=DATASET_SCHEMA))
+            rows_written += len(records)
+
+    os.replace(tmp_path, output_path)
+    return rows_written
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest):
+    os.makedirs(DATASET_DIR, exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def convert_reports_to_parquet(workers=None, force=False):
+    """
+    Incremental converter: every PDF in the raw directory becomes one Parquet file under
+    DATASET_DIR/category=<name>/. Files whose SHA-256 matches the manifest are skipped,
+    changed files are re-parsed in a process pool, and outputs of removed PDFs are deleted.
+    """
+    if not os.path.exists(INPUT_DIR):
+        print(f"Directory not found: {INPUT_DIR}")
+        return
+
+    manifest = {} if force else load_manifest()
+    pdf_files = sorted(f for f in os.listdir(INPUT_DIR) if f.lower().endswith('.pdf'))
+
+    pending = {}
+    for filename in pdf_files:
+        sha256 = file_sha256(os.path.join(INPUT_DIR, filename))
+        entry = manifest.get(filename)
+        if entry and entry['sha256'] == sha256 and os.path.exists(os.path.join(DATASET_DIR, entry['output'])):
+            continue
+        pending[filename] = sha256
+
+    for filename in set(manifest) - set(pdf_files):
+        stale_path = os.path.join(DATASET_DIR, manifest.pop(filename)['output'])
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+        print(f"Removed output of deleted report: {filename}")
+
+    print(f"Synchronizing {len(pdf_files)} report files: {len(pending)} new or changed, "
+          f"{len(pdf_files) - len(pending)} unchanged.")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for filename, sha256 in pending.items():
+            output = os.path.join(f"category={report_category(filename)}", f"{os.path.splitext(filename)[0]}.parquet")
+            future = executor.submit(
+                convert_report, os.path.join(INPUT_DIR, filename), os.path.join(DATASET_DIR, output)
+            )
+            futures[future] = (filename, sha256, output)
+
+        for future in as_completed(futures):
+            filename, sha256, output = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
+                continue
+
+            manifest[filename] = {'sha256': sha256, 'rows': rows, 'output': output}
+            # Persist after every file so an interrupted run keeps its progress
+            save_manifest(manifest)
+            print(f"Converted {filename}: {rows} records -> {output}")
+
+    save_manifest(manifest)
+    total = sum(entry['rows'] for entry in manifest.values())
+    print(f"Dataset ready: {DATASET_DIR} ({total} records in {len(manifest)} files)")
+    return total
+
+
+def save_master_csv(df, output_path=MASTER_CSV_PATH):
+    """
+    Sorts the records chronologically (then by category) and writes the legacy CSV.
+    `date` holds DD.MM.YYYY strings, as legacy_pdf_to_csv_converter.py expects.
+    """
+    # Convert date to datetime objects for accurate chronological sorting
+    df['date_dt'] = pd.to_datetime(df['date'], dayfirst=True)
+    # Sort by date and then by category
+    df = df.sort_values(by=['date_dt', 'category']).drop(columns=['date_dt'])
+
+    # Suppress scientific notation for the final preview
+    pd.options.display.float_format = '{:.2f}'.format
+
+    df.to_csv(output_path, index=False, encoding='utf-8')
+    return df
+
+
+def write_master_csv_from_dataset():
+    """
+    Rebuilds u24_master_dataset.csv from the Parquet dataset, so the default run keeps
+    feeding legacy_pdf_to_csv_converter.py without parsing the PDFs a second time.
+    """
+    if not os.path.exists(DATASET_DIR):
+        print(f"Dataset not found: {DATASET_DIR}")
+        return
+
+    df = pq.read_table(DATASET_DIR, partitioning='hive').to_pandas()
+    df = pd.DataFrame({
+        'date': pd.to_datetime(df['date']).dt.strftime('%d.%m.%Y'),
+        'amount_uah': df['amount_uah'],
+        'amount_usd': df['amount_usd'],
+        'fund_name': df['fund_name'].astype(str),
+        'category': df['category'].astype(str),
+    })
+    save_master_csv(df)
+    print(f"Master file saved: {MASTER_CSV_PATH} ({len(df)} records)")
 
 
 def process_reports_to_master_csv():
@@ -10,10 +191,8 @@ def process_reports_to_master_csv():
     Extracts clean category names by isolating the suffix of the filename.
     """
     # 1. Path Management using relative references
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(script_dir)
-    input_dir = os.path.join(project_root, "data", "raw", "united24")
-    output_path = os.path.join(input_dir, "u24_master_dataset.csv")
+    input_dir = INPUT_DIR
+    output_path = MASTER_CSV_PATH
 
     all_records = []
 
@@ -28,65 +207,26 @@ def process_reports_to_master_csv():
     for filename in pdf_files:
         file_path = os.path.join(input_dir, filename)
 
-        # CATEGORY EXTRACTION LOGIC:
-        # Splits 'report-date-health.pdf' by '-' and takes the last part.
-        # Then removes the '.pdf' extension to get a clean 'health' label.
-        clean_category = os.path.splitext(filename.split('-')[-1])[0].lower()
+        # CATEGORY EXTRACTION LOGIC: 'report-date-health.pdf' -> 'health'
+        clean_category = report_category(filename)
 
         try:
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if not text:
-                        continue
-
-                    for line in text.split('\n'):
-                        line = line.strip()
-                        # Identify records starting with the date pattern (DD.MM.YYYY)
-                        date_match = re.search(r'^(\d{2}\.\d{2}\.\d{4})', line)
-                        if not date_match:
-                            continue
-
-                        date_val = date_match.group(1)
-                        content_remainder = line[len(date_val):].strip()
-
-                        # Split by space occurring after the decimal pattern (,XX)
-                        # This separates UAH from USD amounts reliably
-                        data_segments = re.split(r'(?<=,\d{2})\s+', content_remainder)
-
-                        if len(data_segments) >= 2:
-                            try:
-                                # Numerical normalization: remove whitespace, convert decimal comma to dot
-                                uah_float = float(data_segments[0].replace(' ', '').replace(',', '.'))
-                                usd_float = float(data_segments[1].replace(' ', '').replace(',', '.'))
-
-                                all_records.append({
-                                    'date': date_val,
-                                    'amount_uah': uah_float,
-                                    'amount_usd': usd_float,
-                                    'fund_name': 'United24',
-                                    'category': clean_category
-                                })
-                            except (ValueError, IndexError):
-                                # Skip malformed numeric strings
-                                continue
+            for records in iter_report_pages(file_path):
+                for date_val, uah_float, usd_float in records:
+                    all_records.append({
+                        'date': date_val.strftime('%d.%m.%Y'),
+                        'amount_uah': uah_float,
+                        'amount_usd': usd_float,
+                        'fund_name': 'United24',
+                        'category': clean_category
+                    })
         except Exception as e:
             print(f"Error processing {filename}: {str(e)}")
 
     if all_records:
         # 2. DataFrame Construction & Sorting
-        df = pd.DataFrame(all_records)
-
-        # Convert date to datetime objects for accurate chronological sorting
-        df['date_dt'] = pd.to_datetime(df['date'], dayfirst=True)
-        # Sort by date and then by category
-        df = df.sort_values(by=['date_dt', 'category']).drop(columns=['date_dt'])
-
-        # Suppress scientific notation for the final preview
-        pd.options.display.float_format = '{:.2f}'.format
-
-        # 3. Export consolidated data to the processed data directory
-        df.to_csv(output_path, index=False, encoding='utf-8')
+        # 3. Export consolidated data, sorted by date and category
+        df = save_master_csv(pd.DataFrame(all_records), output_path)
 
         print(f"\nConsolidation complete.")
         print(f"Master file saved: {output_path}")
@@ -98,4 +238,18 @@ def process_reports_to_master_csv():
 
 
 if __name__ == "__main__":
-    process_reports_to_master_csv()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert United24 PDF reports into a dataset")
+    parser.add_argument('--csv', action='store_true',
+                        help="Only write u24_master_dataset.csv, parsing the PDFs directly (no Parquet dataset)")
+    parser.add_argument('--no-csv', action='store_true',
+                        help="Skip refreshing u24_master_dataset.csv after the Parquet conversion")
+    parser.add_argument('--workers', type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="Re-parse every PDF, ignoring the manifest")
+    args = parser.parse_args()
+
+    if args.csv:
+        process_reports_to_master_csv()
+    else:
+        convert_reports_to_parquet(args.workers, args.force)
+        if not args.no_csv:
+            write_master_csv_from_dataset()
\ No newline at end of file
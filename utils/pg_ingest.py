@@ -0,0 +1,209 @@
+import os
+import io
+import logging
+import threading
+from contextlib import contextmanager
+
+from psycopg2 import sql
+from psycopg2.pool import ThreadedConnectionPool
+from dotenv import load_dotenv
+
+from utils import instrumentation
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Pool sizing (per process): scrapers with worker pools share these connections
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = int(os.getenv("PG_POOL_MAX", "8"))
+
+# Rows buffered in memory before each COPY round-trip into the staging table
+COPY_BATCH_SIZE = 50000
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns the process-wide connection pool, creating it on first use.
+    Technical Note: a pool inherited through fork() is never reused, so worker
+    processes of a ProcessPoolExecutor transparently open their own connections.
+    """
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            pg_uri = os.getenv("DATABASE_URL")
+            if not pg_uri:
+                raise ValueError("DATABASE_URL not found in environment variables")
+
+            _pool = ThreadedConnectionPool(POOL_MIN_CONN, POOL_MAX_CONN, pg_uri)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrows a connection from the pool. Uncommitted work is rolled back on return.
+    """
+    pg_pool = get_pool()
+    conn = pg_pool.getconn()
+    try:
+        yield conn
+    finally:
+        pg_pool.putconn(conn)
+
+
+def close_pool():
+    """
+    Closes every pooled connection. Safe to call when no pool was created.
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+def _copy_value(value):
+    """
+    Serializes a Python value into a PostgreSQL COPY text-format field.
+    """
+    if value is None:
+        return '\\N'
+
+    text = str(value)
+    return (
+        text.replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def _copy_batch(cursor, copy_stmt, batch):
+    buffer = io.StringIO()
+    for row in batch:
+        buffer.write('\t'.join(_copy_value(v) for v in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(copy_stmt, buffer)
+
+
+def stage_rows(cursor, table, columns, rows, staging_name=None):
+    """
+    Streams rows through COPY into a temporary table shaped like `table`.
+    The staging table is dropped automatically on commit.
+    Returns (staging_name, staged_row_count).
+    """
+    staging_name = staging_name or f"staging_{table}"
+
+    cursor.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(
+        sql.Identifier(staging_name), sql.Identifier(table)
+    ))
+
+    copy_stmt = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        sql.Identifier(staging_name),
+        sql.SQL(', ').join(map(sql.Identifier, columns))
+    ).as_string(cursor)
+
+    staged = 0
+    batch = []
+    with instrumentation.timed('db_copy', table=table):
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= COPY_BATCH_SIZE:
+                _copy_batch(cursor, copy_stmt, batch)
+                staged += len(batch)
+                batch = []
+
+        if batch:
+            _copy_batch(cursor, copy_stmt, batch)
+            staged += len(batch)
+
+    instrumentation.count('db_rows_staged', staged, table=table)
+    return staging_name, staged
+
+
+def _conflict_clause(conflict_columns, update_columns):
+    if not conflict_columns:
+        return sql.SQL("ON CONFLICT DO NOTHING")
+
+    target = sql.SQL(', ').join(map(sql.Identifier, conflict_columns))
+    if not update_columns:
+        return sql.SQL("ON CONFLICT ({}) DO NOTHING").format(target)
+
+    assignments = sql.SQL(', ').join(
+        sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in update_columns
+    )
+    return sql.SQL("ON CONFLICT ({}) DO UPDATE SET {}").format(target, assignments)
+
+
+def bulk_insert(table, columns, rows, conflict_columns=None, update_columns=None, conn=None):
+    """
+    Bulk writer shared by every scraper.
+    Stages rows via COPY, then moves them with a single
+    INSERT ... SELECT ... ON CONFLICT ... RETURNING statement.
+
+    conflict_columns: constraint target; omitted means DO NOTHING on any unique constraint.
+    update_columns: when given, conflicting rows are upserted (DO UPDATE) instead of skipped.
+    conn: when given, the caller owns the transaction (no commit here), so the insert can
+          be committed atomically with other bookkeeping.
+
+    Returns the exact number of rows inserted (or upserted).
+    """
+    if conn is None:
+        with pooled_connection() as own_conn:
+            try:
+                inserted = bulk_insert(table, columns, rows, conflict_columns, update_columns, own_conn)
+                own_conn.commit()
+                return inserted
+            except Exception:
+                own_conn.rollback()
+                raise
+
+    cursor = conn.cursor()
+    staging_name, staged = stage_rows(cursor, table, columns, rows)
+    if not staged:
+        cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(staging_name)))
+        return 0
+
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+
+    # Upserts must not touch the same key twice within one statement
+    select_prefix = sql.SQL("SELECT")
+    if update_columns:
+        select_prefix = sql.SQL("SELECT DISTINCT ON ({})").format(
+            sql.SQL(', ').join(map(sql.Identifier, conflict_columns))
+        )
+
+    # Technical Note: counting RETURNING rows inside the CTE reports exact inserts
+    # without shipping every key back to the client
+    with instrumentation.timed('db_insert', table=table):
+        cursor.execute(sql.SQL("""
+            WITH moved AS (
+                INSERT INTO {table} ({columns})
+                {select_prefix} {columns} FROM {staging}
+                {conflict}
+                RETURNING 1
+            )
+            SELECT COUNT(*) FROM moved
+        """).format(
+            table=sql.Identifier(table),
+            columns=column_list,
+            select_prefix=select_prefix,
+            staging=sql.Identifier(staging_name),
+            conflict=_conflict_clause(conflict_columns, update_columns)
+        ))
+        inserted = cursor.fetchone()[0]
+    instrumentation.count('db_rows_inserted', inserted, table=table)
+
+    # Drop now rather than at commit, so several writes can share one transaction
+    cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(staging_name)))
+
+    logging.debug(f"bulk_insert({table}): staged {staged}, inserted {inserted}")
+    return inserted
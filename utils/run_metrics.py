@@ -0,0 +1,94 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# One structured metrics record per scraper run.
+# The record is printed as a single JSON line and must be the final stdout line, because
+# BashOperator pushes the last line to XCom; alert_telegram_bot/telegram_report.py renders
+# throughput from it.
+
+# Counters every record carries, even when a scraper never touches them
+STANDARD_COUNTERS = ('rows_fetched', 'rows_inserted', 'rows_skipped', 'http_requests', 'bytes_downloaded')
+# Record keys that are not counters
+RECORD_FIELDS = ('task', 'status', 'wall_seconds', 'stages', 'changed_since')
+
+
+class RunMetrics:
+    """
+    Thread-safe counters plus wall-clock stage timers for a single run.
+    Stages may repeat (their time accumulates) and may nest.
+    """
+
+    def __init__(self, task):
+        self.task = task
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(STANDARD_COUNTERS, 0)
+        self._stages = {}
+        self._changed_since = None
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe_response(self, response):
+        """Counts one HTTP request and the size of its body."""
+        with self._lock:
+            self._counters['http_requests'] += 1
+            self._counters['bytes_downloaded'] += len(response.content or b'')
+
+    def note_changed_since(self, day):
+        """
+        Records the earliest date (YYYY-MM-DD) whose stored data this run changed.
+        Downstream conversion and rollup tasks start from it.
+        """
+        day = str(day)[:10]
+        with self._lock:
+            if self._changed_since is None or day < self._changed_since:
+                self._changed_since = day
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._stages[name] = self._stages.get(name, 0.0) + elapsed
+
+    def merge(self, record):
+        """
+        Adds counters and stage times of another record, e.g. one returned by a worker process.
+        Merged stage times are summed across workers, so they can exceed wall time.
+        """
+        with self._lock:
+            for name, value in record.items():
+                if name not in RECORD_FIELDS:
+                    self._counters[name] = self._counters.get(name, 0) + value
+            for name, seconds in record.get('stages', {}).items():
+                self._stages[name] = self._stages.get(name, 0.0) + seconds
+        if record.get('changed_since'):
+            self.note_changed_since(record['changed_since'])
+
+    def as_record(self, status='ok'):
+        with self._lock:
+            record = {
+                'task': self.task,
+                'status': status,
+                'wall_seconds': round(time.perf_counter() - self._started, 3),
+                **self._counters,
+                'stages': {name: round(seconds, 3) for name, seconds in self._stages.items()},
+            }
+            if self._changed_since:
+                record['changed_since'] = self._changed_since
+            return record
+
+    def emit(self, status='ok'):
+        """
+        Prints the record as the final stdout line and returns it.
+        """
+        record = self.as_record(status)
+        print(json.dumps(record, sort_keys=True), flush=True)
+        return record
@@ -0,0 +1,153 @@
+import os
+import re
+from datetime import datetime
+
+import pdfplumber
+
+try:
+    import pypdfium2
+except ImportError:  # shipped with pdfplumber >= 0.11; older installs fall back to pdfminer text
+    pypdfium2 = None
+
+from utils import instrumentation
+
+# Shared parser for the United24 daily donation reports, used by the live scraper and the
+# legacy dataset converter. Each report row is "DD.MM.YYYY <UAH equiv> <USD equiv>" with
+# space-grouped thousands and decimal commas. Strategies differ only in how the text is read:
+#   pdfium  - pypdfium2 text layer (PDFium, C); default when available
+#   text    - pdfplumber extract_text() (pdfminer layout analysis)
+#   words   - pdfplumber extract_words() regrouped into lines by position
+#   table   - pdfplumber extract_table() (ruling-line table detection); UAH/USD from the cells
+# benchmarks/pdf_strategies.py compares their speed, memory and agreement on data/raw/united24;
+# on the bundled reports all four produce identical rows and pdfium is ~60x faster than table.
+# U24_PDF_STRATEGY overrides the choice.
+
+STRATEGIES = ('pdfium', 'text', 'words', 'table')
+DEFAULT_STRATEGY = os.getenv("U24_PDF_STRATEGY", 'pdfium' if pypdfium2 else 'text')
+
+DATE_PATTERN = re.compile(r'^(\d{2}\.\d{2}\.\d{4})')
+# UAH and USD are separated by the first whitespace after a ",XX" decimal part
+AMOUNT_SPLIT_PATTERN = re.compile(r'(?<=,\d{2})\s+')
+# Words whose tops differ by less than this (in points) belong to the same line
+LINE_TOLERANCE = 3
+
+
+def parse_amount(value):
+    return float(value.replace(' ', '').replace('\xa0', '').replace(',', '.'))
+
+
+def parse_report_line(line):
+    """
+    Extracts (date, amount_uah, amount_usd) from one text line, or None.
+    """
+    line = line.strip()
+    date_match = DATE_PATTERN.match(line)
+    if not date_match:
+        return None
+
+    date_val = date_match.group(1)
+    data_segments = AMOUNT_SPLIT_PATTERN.split(line[len(date_val):].strip())
+    if len(data_segments) < 2:
+        return None
+
+    try:
+        return (datetime.strptime(date_val, '%d.%m.%Y').date(),
+                parse_amount(data_segments[0]), parse_amount(data_segments[1]))
+    except (ValueError, IndexError):
+        return None
+
+
+def _lines_to_rows(lines):
+    return [record for record in map(parse_report_line, lines) if record]
+
+
+def _text_rows(page):
+    return _lines_to_rows((page.extract_text() or '').split('\n'))
+
+
+def _word_rows(page):
+    lines, current, current_top = [], [], None
+    for word in sorted(page.extract_words(), key=lambda w: (round(w['top']), w['x0'])):
+        if current_top is not None and word['top'] - current_top > LINE_TOLERANCE:
+            lines.append(current)
+            current = []
+        if not current:
+            current_top = word['top']
+        current.append(word)
+    if current:
+        lines.append(current)
+
+    return _lines_to_rows(' '.join(w['text'] for w in sorted(line, key=lambda w: w['x0'])) for line in lines)
+
+
+def _table_rows(page):
+    rows = []
+    for row in page.extract_table() or []:
+        try:
+            if not DATE_PATTERN.match(row[0]) or len(row[0]) != 10:
+                continue
+            try:
+                amount_usd = parse_amount(row[2])
+            except (ValueError, IndexError, AttributeError):
+                amount_usd = None
+            rows.append((datetime.strptime(row[0], '%d.%m.%Y').date(), parse_amount(row[1]), amount_usd))
+        except (ValueError, IndexError, TypeError, AttributeError):
+            continue
+    return rows
+
+
+PDFPLUMBER_PAGE_PARSERS = {'text': _text_rows, 'words': _word_rows, 'table': _table_rows}
+
+
+def count_pages(path):
+    if pypdfium2 is not None:
+        pdf = pypdfium2.PdfDocument(str(path))
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def iter_report_pages(path, first_page=0, last_page=None, strategy=None):
+    """
+    Yields the rows of every page in [first_page, last_page) of one report, one list per page.
+    """
+    strategy = strategy or DEFAULT_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown U24_PDF_STRATEGY '{strategy}' (expected one of {', '.join(STRATEGIES)})")
+
+    if strategy == 'pdfium':
+        if pypdfium2 is None:
+            raise ImportError("The 'pdfium' strategy needs pypdfium2")
+        pdf = pypdfium2.PdfDocument(str(path))
+        try:
+            for index in range(first_page, min(last_page or len(pdf), len(pdf))):
+                with instrumentation.timed('pdf_page_parse', parser=strategy):
+                    page = pdf[index]
+                    text_page = page.get_textpage()
+                    text = text_page.get_text_range()
+                    text_page.close()
+                    page.close()
+                yield _lines_to_rows(text.replace('\r', '').split('\n'))
+        finally:
+            pdf.close()
+        return
+
+    page_parser = PDFPLUMBER_PAGE_PARSERS[strategy]
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages[first_page:last_page]:
+            with instrumentation.timed('pdf_page_parse', parser=strategy):
+                rows = page_parser(page)
+            # Drop the page's cached layout objects; long reports otherwise keep every page in memory
+            page.close()
+            yield rows
+
+
+def parse_report(path, first_page=0, last_page=None, strategy=None):
+    """
+    All (date, amount_uah, amount_usd) rows of pages [first_page, last_page) of one report.
+    amount_usd is None when the table strategy cannot read the USD cell.
+    """
+    return [row for rows in iter_report_pages(path, first_page, last_page, strategy) for row in rows]